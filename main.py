@@ -1,19 +1,176 @@
 import streamlit as st
+import asyncio
+import functools
+import hashlib
 import textwrap
 import time
 import os
-from src.langchain_pipeline.processor import VideoProcessor
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from src.ui.progress import ProgressManager
-from src.utils.language_support import LanguageProcessor
+from src.config.settings import YOUTUBE_URL_RE, YOUTUBE_VIDEO_ID_RE, MAX_CONCURRENT_REQUESTS
 
 # Set page configuration
 st.set_page_config(page_title="🎬 YouTube AI Assistant", layout="centered")
 st.title("🎬 YouTube AI Assistant")
 
-# Initialize components
-processor = VideoProcessor()
+# Initialize components (cached so Streamlit reruns reuse the same instances).
+# Heavy pipeline modules are imported on first use to keep cold starts cheap.
+@st.cache_resource
+def get_processor():
+    from src.langchain_pipeline.processor import VideoProcessor
+    return VideoProcessor()
+
+@st.cache_resource
+def get_language_processor():
+    from src.utils.language_support import LanguageProcessor
+    return LanguageProcessor()
+
+@st.cache_data
+def get_supported_languages():
+    return get_language_processor().get_supported_languages()
+
+@st.cache_data
+def get_language_codes():
+    return {lang["name"]: lang["code"] for lang in get_supported_languages()}
+
+# Chroma handles aren't picklable, so processed videos are cached as resources.
+# Keyed on the canonical video ID; the leading underscores keep the raw URL,
+# progress callback and job out of the cache key.
+@st.cache_resource(show_spinner=False, max_entries=32)
+def process_video_cached(video_id: str, duration: str, quality: str, parallel: int,
+                         _url: str = None, _progress_callback=None, _job: dict = None):
+    # Parallelization is passed per call; the processor is shared by every session
+    db, audio_size = get_processor().process_video(
+        _url,
+        duration_choice=duration,
+        progress_callback=_progress_callback,
+        parallelization=parallel
+    )
+    
+    # Only the job that actually processed the video records its audio size;
+    # cache hits skip this body and report nothing new
+    if _job is not None:
+        _job["audio_size"] = audio_size
+    return db
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+
+def get_processing_job(video_id: str, url: str, duration: str, quality: str, parallel: int) -> dict:
+    """
+    Get the background job processing a video, starting one if needed
+    
+    Jobs live in session state, so a rerun that interrupts the script picks up
+    the in-flight job instead of restarting the download and transcription.
+    Progress is written to the job dict and rendered by the polling script.
+    """
+    jobs = st.session_state.setdefault("processing_jobs", {})
+    job_key = (video_id, duration, quality, parallel)
+    
+    if job_key not in jobs:
+        job = {"progress": ("Queued", 0, "Waiting to start", None)}
+        
+        def report_progress(step, percentage, message=None, remaining_seconds=None):
+            job["progress"] = (step, percentage, message, remaining_seconds)
+        
+        job["future"] = get_executor().submit(
+            process_video_cached, video_id, duration, quality, parallel,
+            _url=url, _progress_callback=report_progress, _job=job
+        )
+        jobs[job_key] = job
+    
+    return jobs[job_key]
+
+def wait_for_job(job: dict, progress_display, poll_seconds: float = 0.5):
+    """Render a background job's progress until it finishes and return its result"""
+    try:
+        while not job["future"].done():
+            progress_display.update(*job["progress"])
+            time.sleep(poll_seconds)
+        return job["future"].result()
+    finally:
+        if job["future"].done():
+            jobs = st.session_state.get("processing_jobs", {})
+            for key in [key for key, value in jobs.items() if value is job]:
+                del jobs[key]
+
+# Responses are cached per video (db_id) so repeat questions skip the LLM call.
+# The database handle itself is passed through unhashed.
+@st.cache_data(show_spinner=False, max_entries=128)
+def answer_question_cached(db_id: str, query: str, k: int, model: str, _db=None):
+    return get_processor().answer_question(_db, query, k=k, model_name=model)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def summarize_video_cached(db_id: str, model: str, length: str, _db=None):
+    return get_processor().summarize_video(_db, model_name=model, summary_length=length)
+
+# Streamed responses can't go through st.cache_data, so their final text is kept
+# here under the same per-video keys and shared across sessions
+STREAMED_RESPONSES_MAX_ENTRIES = 128
+
+@st.cache_resource
+def get_streamed_responses():
+    return OrderedDict(), threading.Lock()
+
+def get_streamed_response(key: tuple):
+    """Get a previously streamed response, or None"""
+    responses, lock = get_streamed_responses()
+    with lock:
+        if key not in responses:
+            return None
+        responses.move_to_end(key)
+        return responses[key]
+
+def put_streamed_response(key: tuple, value) -> None:
+    """Keep a streamed response, evicting the least recently used when full"""
+    responses, lock = get_streamed_responses()
+    with lock:
+        responses[key] = value
+        responses.move_to_end(key)
+        while len(responses) > STREAMED_RESPONSES_MAX_ENTRIES:
+            responses.popitem(last=False)
+
+async def answer_and_detect_language(db_id: str, query: str, k: int, model: str, db):
+    """Answer the question and detect the query language concurrently"""
+    loop = asyncio.get_event_loop()
+    answer = loop.run_in_executor(
+        None, functools.partial(answer_question_cached, db_id, query, k, model, _db=db)
+    )
+    return await asyncio.gather(answer, get_language_processor().adetect_language(query))
+
+def get_result_key(*parts) -> str:
+    """Stable key for a rendered result, stored in session state"""
+    return "result::" + hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def wrap_text(text: str, width: int = 85) -> str:
+    return textwrap.fill(text, width=width)
+
+def render_snippets(snippets: list) -> None:
+    """Render matched transcript snippets"""
+    if snippets:
+        st.markdown("### 📄 Matched Transcript Snippets:")
+        for snippet in snippets:
+            st.code(snippet)
+
+def render_result(result: dict) -> None:
+    """Render a stored answer or summary"""
+    st.subheader(result["title"])
+    st.text(wrap_text(result["response"]))
+    render_snippets(result.get("snippets"))
+
+def store_result(key: str, title: str, response: str, snippets: list = None,
+                 render: bool = True) -> None:
+    """Save a result to session state and optionally render it"""
+    st.session_state[key] = {"title": title, "response": response, "snippets": snippets or []}
+    if render:
+        render_result(st.session_state[key])
+
+# Built per script run: it holds this session's placeholder, so it must not be shared
 progress_mgr = ProgressManager()
-language_processor = LanguageProcessor()
 
 # Main application form
 with st.sidebar:
@@ -50,7 +207,7 @@ with st.sidebar:
         )
         
         # Language selection
-        supported_languages = language_processor.get_supported_languages()
+        supported_languages = get_supported_languages()
         language_options = ["Auto-detect"] + [lang["name"] for lang in supported_languages]
         selected_language = st.selectbox(
             "🌐 Output Language",
@@ -75,163 +232,215 @@ with st.sidebar:
         # Submit button
         submit_button = st.form_submit_button(label="🚀 Submit")
 
+youtube_url = youtube_url.strip()
+
 if submit_button and youtube_url:
     # Validate YouTube URL
-    if not youtube_url.startswith("https://www.youtube.com") and not youtube_url.startswith("https://youtu.be"):
+    video_match = YOUTUBE_VIDEO_ID_RE.search(youtube_url)
+    if not YOUTUBE_URL_RE.match(youtube_url) or not video_match:
         st.warning("⚠️ Please enter a valid YouTube URL.")
     else:
-        try:
-            # Initialize progress display
-            progress_display = progress_mgr.initialize()
-            
-            # Set parallelization level in processor
-            processor.set_parallelization(parallelization)
-            
-            # Process video
-            db, audio_size = processor.process_video(
-                youtube_url,
-                duration_choice=audio_duration,
-                progress_callback=progress_display.update
-            )
-            
-            # Clear progress display
-            progress_display.clear()
+        video_id = video_match.group(1)
+        result_key = get_result_key(
+            video_id,
+            audio_duration,
+            processing_quality,
+            mode,
+            summary_length if mode == "Summarize Video" else query.strip(),
+            selected_language
+        )
+        
+        # Reuse the result from an identical earlier submission in this session
+        if result_key in st.session_state:
+            render_result(st.session_state[result_key])
+        else:
+            language_processor = get_language_processor()
             
-            # Display success message
-            if audio_size > 0:
-                st.success(f"🎧 New audio processed! Compressed size: {audio_size:.2f} MB")
-            else:
-                st.info("📦 Using previously processed transcript (from ChromaDB cache)")
-
-            # Process request based on selected mode
-            if mode == "Summarize Video":
-                with st.spinner("📝 Summarizing video content..."):
-                    try:
-                        # Get language code if not auto-detect
-                        target_language = None
-                        if selected_language != "Auto-detect":
-                            # Find the language code based on selected name
-                            for lang in supported_languages:
-                                if lang["name"] == selected_language:
-                                    target_language = lang["code"]
-                                    break
-                        
-                        # Use user-selected summary length
-                        response = processor.summarize_video(
-                            db, 
-                            model_name="gpt-3.5-turbo-instruct", 
-                            summary_length=summary_length
-                        )
-                        
-                        # Translate if needed
-                        if target_language:
-                            with st.spinner(f"🌐 Translating to {selected_language}..."):
-                                response = language_processor.translate_text(response, target_language)
-                        
-                        # Display summary
-                        st.subheader("📋 Summary:")
-                        st.text(textwrap.fill(response, width=85))
-                        
-                    except Exception as e:
-                        # Handle summarization errors
-                        st.error(f"❌ Error during summarization: {str(e)}")
-                        st.info("Trying alternative summarization approach for very long videos...")
-                        
-                        # Fallback to brief summary with simpler model
+            try:
+                # Initialize progress display
+                progress_display = progress_mgr.initialize()
+                
+                # Process video in the background (memoized on video, duration,
+                # quality and parallelization) and poll it for progress
+                job = get_processing_job(
+                    video_id,
+                    youtube_url,
+                    audio_duration,
+                    processing_quality,
+                    parallelization
+                )
+                db = wait_for_job(job, progress_display)
+                audio_size = job.get("audio_size", 0)
+                
+                db_id = f"{video_id}|{audio_duration}"
+                
+                # Clear progress display
+                progress_display.clear()
+                
+                # Display success message
+                if audio_size > 0:
+                    st.success(f"🎧 New audio processed! Compressed size: {audio_size:.2f} MB")
+                else:
+                    st.info("📦 Using previously processed transcript (from ChromaDB cache)")
+
+                # Process request based on selected mode
+                if mode == "Summarize Video":
+                    with st.spinner("📝 Summarizing video content..."):
                         try:
-                            response = processor.summarize_video(
-                                db, 
-                                model_name="gpt-3.5-turbo-instruct", 
-                                summary_length="Brief"
-                            )
+                            # Get language code if not auto-detect
+                            target_language = get_language_codes().get(selected_language)
                             
-                            # Translate if needed
                             if target_language:
+                                # Use user-selected summary length
+                                response = summarize_video_cached(
+                                    db_id,
+                                    "gpt-3.5-turbo-instruct",
+                                    summary_length,
+                                    _db=db
+                                )
+                                
+                                # Translate before displaying
                                 with st.spinner(f"🌐 Translating to {selected_language}..."):
                                     response = language_processor.translate_text(response, target_language)
-                                    
-                            st.subheader("📋 Summary (Reduced):")
-                            st.text(textwrap.fill(response, width=85))
+                                
+                                # Display summary
+                                store_result(result_key, "📋 Summary:", response)
+                            else:
+                                # No translation needed, so stream the summary as it is generated
+                                # unless this video's summary was already streamed
+                                cache_key = ("summary", db_id, "gpt-3.5-turbo-instruct", summary_length)
+                                response = get_streamed_response(cache_key)
+                                st.subheader("📋 Summary:")
+                                if response is not None:
+                                    st.text(wrap_text(response))
+                                else:
+                                    response = st.write_stream(get_processor().summarize_video_stream(
+                                        db,
+                                        model_name="gpt-3.5-turbo-instruct",
+                                        summary_length=summary_length
+                                    ))
+                                    put_streamed_response(cache_key, response)
+                                store_result(result_key, "📋 Summary:", response, render=False)
                             
-                        except Exception as e2:
-                            st.error("Unable to generate summary. The video may be too long or complex.")
-                            st.info("Try using the Question Answering mode instead, which can handle longer content better.")
-                        
-            else:  # Question Answering mode
-                # Validate query
-                if query.strip() == "":
-                    st.warning("⚠️ Please enter a question.")
-                    st.stop()
-
-                with st.spinner("💬 Thinking..."):
-                    try:
-                        # Detect query language for potential translation
-                        query_lang_code, query_lang_name = language_processor.detect_language(query)
-                        
-                        # Get target language code if not auto-detect
-                        target_language = None
-                        if selected_language != "Auto-detect":
-                            # Find the language code based on selected name
-                            for lang in supported_languages:
-                                if lang["name"] == selected_language:
-                                    target_language = lang["code"]
-                                    break
-                        
-                        # Use default settings
-                        response, relevant_docs = processor.answer_question(
-                            db, 
-                            query, 
-                            k=3,  # Use a moderate context size
-                            model_name="gpt-3.5-turbo-instruct"
-                        )
-                        
-                        # Translate response if needed
-                        if target_language and target_language != query_lang_code:
-                            with st.spinner(f"🌐 Translating to {selected_language}..."):
-                                response = language_processor.translate_text(response, target_language)
-                        
-                        # Display answer
-                        st.subheader("💡 Answer:")
-                        st.text(textwrap.fill(response, width=85))
-                        
-                        # Show relevant transcript snippets
-                        st.markdown("### 📄 Matched Transcript Snippets:")
-                        for doc in relevant_docs[:2]:  # Limit to 2 snippets for clarity
-                            # Limit display length
-                            snippet = doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content
-                            st.code(textwrap.fill(snippet, width=80))
+                        except Exception as e:
+                            # Handle summarization errors
+                            st.error(f"❌ Error during summarization: {str(e)}")
+                            st.info("Trying alternative summarization approach for very long videos...")
                             
-                    except Exception as e:
-                        # Handle QA errors
-                        st.error(f"❌ Error during Q&A: {str(e)}")
-                        
-                        # Automatically fall back to simplified approach
-                        time.sleep(1)  # Brief pause to show the error message
-                        with st.spinner("Trying simplified approach..."):
+                            # Fallback to brief summary with simpler model
                             try:
-                                response, _ = processor.answer_question(
-                                    db, query, k=1, model_name="gpt-3.5-turbo-instruct"
+                                response = summarize_video_cached(
+                                    db_id,
+                                    "gpt-3.5-turbo-instruct",
+                                    "Brief",
+                                    _db=db
                                 )
                                 
                                 # Translate if needed
-                                if target_language and target_language != query_lang_code:
+                                if target_language:
                                     with st.spinner(f"🌐 Translating to {selected_language}..."):
                                         response = language_processor.translate_text(response, target_language)
                                         
-                                st.subheader("💡 Answer (Simplified):")
-                                st.text(textwrap.fill(response, width=85))
+                                store_result(result_key, "📋 Summary (Reduced):", response)
                                 
                             except Exception as e2:
-                                st.error("Unable to process this question with the current video.")
-                                st.info("Try asking a more specific question or processing a shorter segment of the video.")
-
-        except FileNotFoundError as e:
-            st.error(str(e))
-        except RuntimeError as e:
-            st.error(str(e))
-        except Exception as e:
-            st.error(f"❌ Unexpected error: {str(e)}")
-            st.info("If processing a very long video, try the 'Fast' processing option or select a shorter duration.")
+                                st.error("Unable to generate summary. The video may be too long or complex.")
+                                st.info("Try using the Question Answering mode instead, which can handle longer content better.")
+                            
+                else:  # Question Answering mode
+                    # Validate query
+                    if query.strip() == "":
+                        st.warning("⚠️ Please enter a question.")
+                        st.stop()
+
+                    with st.spinner("💬 Thinking..."):
+                        try:
+                            # Get language code if not auto-detect
+                            target_language = get_language_codes().get(selected_language)
+                            query_lang_code = None
+                            
+                            if target_language:
+                                # Answer with default settings while detecting the query
+                                # language for potential translation
+                                (response, relevant_docs), (query_lang_code, query_lang_name) = asyncio.run(
+                                    answer_and_detect_language(
+                                        db_id,
+                                        query,
+                                        3,  # Use a moderate context size
+                                        "gpt-3.5-turbo-instruct",
+                                        db
+                                    )
+                                )
+                                
+                                # Translate response if needed
+                                if target_language != query_lang_code:
+                                    with st.spinner(f"🌐 Translating to {selected_language}..."):
+                                        response = language_processor.translate_text(response, target_language)
+                            else:
+                                # No translation needed, so stream the answer as it is generated
+                                # unless this question was already answered for the video
+                                cache_key = ("qa", db_id, query, 3, "gpt-3.5-turbo-instruct")
+                                cached = get_streamed_response(cache_key)
+                                st.subheader("💡 Answer:")
+                                if cached is not None:
+                                    response, relevant_docs = cached
+                                    st.text(wrap_text(response))
+                                else:
+                                    token_stream, relevant_docs = get_processor().answer_question_stream(
+                                        db,
+                                        query,
+                                        k=3,  # Use a moderate context size
+                                        model_name="gpt-3.5-turbo-instruct"
+                                    )
+                                    response = st.write_stream(token_stream)
+                                    put_streamed_response(cache_key, (response, relevant_docs))
+                            
+                            # Display answer with relevant transcript snippets
+                            snippets = []
+                            for doc in relevant_docs[:2]:  # Limit to 2 snippets for clarity
+                                # Use the snippet precomputed at ingest, formatting on the fly
+                                # for databases built before snippets were stored
+                                snippet = doc.metadata.get("snippet")
+                                if not snippet:
+                                    content = doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content
+                                    snippet = textwrap.fill(content, width=80)
+                                snippets.append(snippet)
+                            
+                            if target_language:
+                                store_result(result_key, "💡 Answer:", response, snippets)
+                            else:
+                                render_snippets(snippets)
+                                store_result(result_key, "💡 Answer:", response, snippets, render=False)
+                                
+                        except Exception as e:
+                            # Handle QA errors
+                            st.error(f"❌ Error during Q&A: {str(e)}")
+                            
+                            # Automatically fall back to simplified approach
+                            with st.spinner("Trying simplified approach..."):
+                                try:
+                                    response, _ = answer_question_cached(
+                                        db_id, query, 1, "gpt-3.5-turbo-instruct", _db=db
+                                    )
+                                    
+                                    # Translate if needed
+                                    if target_language and target_language != query_lang_code:
+                                        with st.spinner(f"🌐 Translating to {selected_language}..."):
+                                            response = language_processor.translate_text(response, target_language)
+                                            
+                                    store_result(result_key, "💡 Answer (Simplified):", response)
+                                    
+                                except Exception as e2:
+                                    st.error("Unable to process this question with the current video.")
+                                    st.info("Try asking a more specific question or processing a shorter segment of the video.")
+
+            except FileNotFoundError as e:
+                st.error(str(e))
+            except RuntimeError as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"❌ Unexpected error: {str(e)}")
+                st.info("If processing a very long video, try the 'Fast' processing option or select a shorter duration.")
 
 # Footer
 st.markdown("---")
@@ -1,4 +1,6 @@
 import os
+import re
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,29 +14,65 @@ LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY", "")
 DEFAULT_QA_MODEL = os.getenv("DEFAULT_QA_MODEL", "gpt-3.5-turbo-instruct")
 DEFAULT_SUMMARY_MODEL = os.getenv("DEFAULT_SUMMARY_MODEL", "gpt-3.5-turbo-instruct")
 TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "whisper-1")
-EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "text-embedding-ada-002")
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
+EMBEDDINGS_DIMENSIONS = int(os.getenv("EMBEDDINGS_DIMENSIONS", "512"))
 
 # Application Storage
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(BASE_DIR, "cache"))
-DB_DIR = os.getenv("DB_DIR", os.path.join(BASE_DIR, "chroma_db"))
+BASE_DIR = Path(__file__).resolve().parents[2]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", BASE_DIR / "cache"))
+DB_DIR = Path(os.getenv("DB_DIR", BASE_DIR / "chroma_db"))
+
+# LLM Response Cache (exact prompt matches are answered without an API call)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", CACHE_DIR / "llm_cache.db"))
 
 # Audio Processing
 DEFAULT_BITRATE = os.getenv("DEFAULT_BITRATE", "32k")
-LONG_VIDEO_BITRATE = os.getenv("LONG_VIDEO_BITRATE", "16k")
+LONG_VIDEO_BITRATE = os.getenv("LONG_VIDEO_BITRATE", "32k")  # Long videos are split into chunks, so size isn't a constraint
 LONG_VIDEO_THRESHOLD_MINUTES = int(os.getenv("LONG_VIDEO_THRESHOLD_MINUTES", "60"))
 
 # Performance Settings
 MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "3"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # Chunks per embeddings request
+TRANSCRIPTION_MAX_RPM = int(os.getenv("TRANSCRIPTION_MAX_RPM", "50"))  # Whisper requests per minute across all videos
+TRANSCRIPTION_OVERLAP_MS = int(os.getenv("TRANSCRIPTION_OVERLAP_MS", "2000"))  # Audio shared by consecutive chunks
+
+# Translation Settings
+TRANSLATION_MAX_CONCURRENCY = int(os.getenv("TRANSLATION_MAX_CONCURRENCY", "8"))  # In-flight chunk translations
+TRANSLATION_BATCH_API_MIN_SEGMENTS = int(os.getenv("TRANSLATION_BATCH_API_MIN_SEGMENTS", "50"))  # Opted-in Batch API use starts above this
+TRANSLATION_JSON_GROUP_TOKENS = int(os.getenv("TRANSLATION_JSON_GROUP_TOKENS", "1500"))  # Segment text per JSON translation request
+
+# Summarization Rate Limits (requests and tokens per minute for map-step calls)
+SUMMARY_MAX_RPM = int(os.getenv("SUMMARY_MAX_RPM", "3500"))
+SUMMARY_MAX_TPM = int(os.getenv("SUMMARY_MAX_TPM", "90000"))
+
+# Evaluation Rate Limits (requests and tokens per minute for evaluator calls)
+EVAL_MAX_RPM = int(os.getenv("EVAL_MAX_RPM", "200"))
+EVAL_MAX_TPM = int(os.getenv("EVAL_MAX_TPM", "40000"))
+
+# Retrieval Settings
+QA_RELEVANCE_THRESHOLD = float(os.getenv("QA_RELEVANCE_THRESHOLD", "0.3"))
+
+# Vector Store Settings (HNSW index parameters applied when a collection is created)
+CHROMA_HNSW = {
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "100")),
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "16")),
+}
 
 # External Tools
 FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
 
+# Input Validation
+YOUTUBE_URL_RE = re.compile(r"^https://(?:www\.youtube\.com|youtu\.be)/")
+YOUTUBE_VIDEO_ID_RE = re.compile(r"(?:[?&]v=|youtu\.be/|/embed/|/shorts/|/live/)([A-Za-z0-9_-]{11})")
+
 # LangSmith Settings
 LANGSMITH_PROJECT_NAME = os.getenv("LANGSMITH_PROJECT_NAME", "youtube-ai-assistant")
 LANGSMITH_API_URL = os.getenv("LANGSMITH_API_URL", "https://api.smith.langchain.com")
 LANGSMITH_TRACING_ENABLED = os.getenv("LANGSMITH_TRACING_ENABLED", "false").lower() == "true"
 
 # Create required directories
-os.makedirs(CACHE_DIR, exist_ok=True)
-os.makedirs(DB_DIR, exist_ok=True)
\ No newline at end of file
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DB_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -5,28 +5,122 @@ from langchain.memory import ConversationBufferMemory
 from langchain.chains import LLMChain
 from langchain import PromptTemplate
 from langchain.llms import OpenAI
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
+from openai import RateLimitError
 from typing import List, Dict, Any, Optional, Union
 from src.config.settings import (
     OPENAI_API_KEY, 
     LANGSMITH_API_KEY, 
     LANGSMITH_PROJECT_NAME, 
-    LANGSMITH_TRACING_ENABLED
+    LANGSMITH_TRACING_ENABLED,
+    MAX_CONCURRENT_REQUESTS,
+    EVAL_MAX_RPM,
+    EVAL_MAX_TPM
 )
+from src.langchain_pipeline.llm import get_llm, count_tokens, RateLimiter
+import asyncio
+import atexit
+import functools
 import os
+import threading
+import time
 
 # Configure LangSmith tracing
 if LANGSMITH_TRACING_ENABLED and LANGSMITH_API_KEY:
     os.environ["LANGCHAIN_TRACING"] = "true"
     os.environ["LANGCHAIN_API_KEY"] = LANGSMITH_API_KEY
     os.environ["LANGCHAIN_PROJECT"] = LANGSMITH_PROJECT_NAME
+    # Export traces from background threads so traced calls return immediately,
+    # and flush whatever is still queued when the process exits
+    os.environ["LANGCHAIN_CALLBACKS_BACKGROUND"] = "true"
+    from langchain.callbacks.tracers.langchain import wait_for_all_tracers
+    atexit.register(wait_for_all_tracers)
 else:
     os.environ["LANGCHAIN_TRACING"] = "false"
 
+EVALUATION_MODEL = "gpt-4"
+EVALUATION_MAX_TOKENS = 256
+
+# Criteria for each evaluator type (read-only; evaluators are built once per type)
+EVALUATION_CRITERIA = MappingProxyType({
+    "qa": MappingProxyType({
+        "relevance": "The response directly addresses the question asked.",
+        "accuracy": "The response only contains information from the video transcript.",
+        "completeness": "The response thoroughly answers all aspects of the question.",
+        "coherence": "The response is well-structured, logical, and easy to understand."
+    }),
+    "summary": MappingProxyType({
+        "conciseness": "The summary captures the essential points without unnecessary details.",
+        "comprehensiveness": "The summary covers all the important topics from the video.",
+        "accuracy": "The summary only contains information from the video.",
+        "coherence": "The summary flows logically and is well-structured."
+    }),
+    "multimodal": MappingProxyType({
+        "visual_integration": "The response effectively incorporates visual information from the video.",
+        "audio_visual_alignment": "The response correctly aligns spoken content with visual elements.",
+        "timestamp_accuracy": "Any timestamps mentioned correspond to relevant content in the video.",
+        "multimodal_reasoning": "The response shows understanding that integrates both audio and visual content."
+    })
+})
+
+@lru_cache(maxsize=None)
+def _get_criteria_evaluator(kind: str) -> LLMCriteriaEvaluator:
+    """Build an evaluator once per criteria set and share it across services"""
+    return LLMCriteriaEvaluator(
+        criteria=dict(EVALUATION_CRITERIA[kind]),
+        llm=get_llm(EVALUATION_MODEL, 0, EVALUATION_MAX_TOKENS),
+        normalize_scores=True
+    )
+
 class EvaluationService:
     """Handles evaluation of AI responses using LangSmith"""
     
-    def __init__(self):
-        self.eval_llm = OpenAI(model_name="gpt-4", temperature=0, openai_api_key=OPENAI_API_KEY)
+    def __init__(self, max_rpm: int = EVAL_MAX_RPM, max_tpm: int = EVAL_MAX_TPM,
+                 max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+        """
+        Initialize the evaluation service
+        
+        Args:
+            max_rpm: Maximum evaluator requests per minute
+            max_tpm: Maximum evaluator tokens per minute
+            max_concurrency: Maximum evaluator requests in flight at once
+        """
+        self.max_concurrency = max_concurrency
+        self._limiter = RateLimiter(max_rpm, max_tpm)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+    
+    @property
+    def eval_llm(self) -> OpenAI:
+        """Evaluation LLM, created on first use and shared across instances"""
+        return get_llm(EVALUATION_MODEL, 0, EVALUATION_MAX_TOKENS)
+    
+    def _run_evaluator(self, evaluator: LLMCriteriaEvaluator, max_attempts: int = 6,
+                       **eval_input) -> Dict[str, Any]:
+        """
+        Run an evaluator within the rate limits, backing off when rate limited
+        
+        Args:
+            evaluator: The criteria evaluator to run
+            max_attempts: Attempts before a rate limit error is raised
+            **eval_input: Strings passed to evaluate_strings
+            
+        Returns:
+            Evaluation results as a dictionary
+        """
+        tokens = sum(count_tokens(value, EVALUATION_MODEL) for value in eval_input.values())
+        tokens += EVALUATION_MAX_TOKENS
+        
+        for attempt in range(max_attempts):
+            self._limiter.acquire(tokens)
+            try:
+                with self._slots:
+                    return evaluator.evaluate_strings(**eval_input)
+            except RateLimitError:
+                if attempt == max_attempts - 1:
+                    raise
+                time.sleep(10 * 2 ** attempt)
     
     @traceable(name="qa_chain")
     def traceable_qa(self, chain_func, *args, **kwargs):
@@ -45,48 +139,15 @@ class EvaluationService:
     
     def create_qa_evaluator(self) -> LLMCriteriaEvaluator:
         """Create an evaluator for QA responses"""
-        criteria = {
-            "relevance": "The response directly addresses the question asked.",
-            "accuracy": "The response only contains information from the video transcript.",
-            "completeness": "The response thoroughly answers all aspects of the question.",
-            "coherence": "The response is well-structured, logical, and easy to understand."
-        }
-        
-        return LLMCriteriaEvaluator(
-            criteria=criteria,
-            llm=self.eval_llm,
-            normalize_scores=True
-        )
+        return _get_criteria_evaluator("qa")
     
     def create_summary_evaluator(self) -> LLMCriteriaEvaluator:
         """Create an evaluator for summary responses"""
-        criteria = {
-            "conciseness": "The summary captures the essential points without unnecessary details.",
-            "comprehensiveness": "The summary covers all the important topics from the video.",
-            "accuracy": "The summary only contains information from the video.",
-            "coherence": "The summary flows logically and is well-structured."
-        }
-        
-        return LLMCriteriaEvaluator(
-            criteria=criteria,
-            llm=self.eval_llm,
-            normalize_scores=True
-        )
+        return _get_criteria_evaluator("summary")
     
     def create_multimodal_evaluator(self) -> LLMCriteriaEvaluator:
         """Create an evaluator for multimodal responses"""
-        criteria = {
-            "visual_integration": "The response effectively incorporates visual information from the video.",
-            "audio_visual_alignment": "The response correctly aligns spoken content with visual elements.",
-            "timestamp_accuracy": "Any timestamps mentioned correspond to relevant content in the video.",
-            "multimodal_reasoning": "The response shows understanding that integrates both audio and visual content."
-        }
-        
-        return LLMCriteriaEvaluator(
-            criteria=criteria,
-            llm=self.eval_llm,
-            normalize_scores=True
-        )
+        return _get_criteria_evaluator("multimodal")
     
     def evaluate_qa(self, question: str, response: str, ground_truth: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -112,7 +173,7 @@ class EvaluationService:
             eval_input["reference"] = ground_truth
             
         # Run evaluation
-        result = evaluator.evaluate_strings(**eval_input)
+        result = self._run_evaluator(evaluator, **eval_input)
         return result
     
     def evaluate_summary(self, transcript: str, summary: str) -> Dict[str, Any]:
@@ -130,17 +191,18 @@ class EvaluationService:
         
         # Use a sample of the transcript if it's too long
         if len(transcript) > 10000:
-            # Take evenly distributed samples
-            parts = []
+            # Take 10 evenly distributed samples
             step = len(transcript) // 10
-            for i in range(0, len(transcript), step):
-                parts.append(transcript[i:i+1000])
-            transcript_sample = "\n...\n".join(parts)
+            starts = range(0, len(transcript), step)
+            transcript_sample = "\n...\n".join(
+                islice((transcript[i:i+1000] for i in starts), 10)
+            )
         else:
             transcript_sample = transcript
         
         # Run evaluation
-        result = evaluator.evaluate_strings(
+        result = self._run_evaluator(
+            evaluator,
             input=transcript_sample,
             prediction=summary
         )
@@ -181,12 +243,45 @@ class EvaluationService:
         """
         
         # Run evaluation
-        result = evaluator.evaluate_strings(
+        result = self._run_evaluator(
+            evaluator,
             input=input_str,
             prediction=response
         )
         return result
     
+    async def evaluate_all(self, *, qa_args: Optional[Dict[str, Any]] = None,
+                           summary_args: Optional[Dict[str, Any]] = None,
+                           multimodal_args: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run the requested evaluations concurrently
+        
+        Args:
+            qa_args: Keyword arguments for evaluate_qa
+            summary_args: Keyword arguments for evaluate_summary
+            multimodal_args: Keyword arguments for evaluate_multimodal
+            
+        Returns:
+            Evaluation results (or the raised exception) keyed by 'qa',
+            'summary' and 'multimodal' for each evaluation that was requested
+        """
+        requested = [
+            (name, func, kwargs) for name, func, kwargs in (
+                ("qa", self.evaluate_qa, qa_args),
+                ("summary", self.evaluate_summary, summary_args),
+                ("multimodal", self.evaluate_multimodal, multimodal_args),
+            ) if kwargs is not None
+        ]
+        
+        # Evaluators are blocking, so run each in a worker thread
+        loop = asyncio.get_event_loop()
+        results = await asyncio.gather(
+            *[loop.run_in_executor(None, functools.partial(func, **kwargs))
+              for _, func, kwargs in requested],
+            return_exceptions=True
+        )
+        return dict(zip((name for name, _, _ in requested), results))
+    
     def run_eval_config(self, chain, dataset, eval_config=None):
         """
         Run a LangSmith evaluation on a chain with a dataset
@@ -220,6 +315,7 @@ class EvaluationService:
             llm_or_chain_factory=chain,
             data=dataset,
             evaluation=eval_config,
+            concurrency_level=self.max_concurrency,
             project_name=f"{LANGSMITH_PROJECT_NAME}_eval_results"
         )
         
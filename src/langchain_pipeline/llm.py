@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+import tiktoken
+from langchain.llms import OpenAI
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from src.config.settings import OPENAI_API_KEY, LLM_CACHE_ENABLED, LLM_CACHE_PATH
+
+# Persist completions keyed on prompt + model settings so repeated requests skip the API
+if LLM_CACHE_ENABLED:
+    set_llm_cache(SQLiteCache(database_path=str(LLM_CACHE_PATH)))
+
+@lru_cache(maxsize=16)
+def get_llm(model_name: str, temperature: float, max_tokens: int) -> OpenAI:
+    """
+    Get a shared OpenAI LLM so its HTTP connection pool is reused across calls
+    
+    Args:
+        model_name: The OpenAI model to use
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        
+    Returns:
+        Cached OpenAI LLM instance for these settings
+    """
+    return OpenAI(
+        model=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        openai_api_key=OPENAI_API_KEY
+    )
+
+@lru_cache(maxsize=16)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    """
+    Get the (cached) tokenizer for a model
+    
+    Args:
+        model_name: The OpenAI model name
+        
+    Returns:
+        tiktoken encoding, falling back to cl100k_base for unknown models
+    """
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model_name: str) -> int:
+    """Count the tokens in text for a model"""
+    return len(get_encoding(model_name).encode(text))
+
+def truncate_to_tokens(text: str, max_tokens: int, model_name: str) -> str:
+    """Truncate text to at most max_tokens tokens for a model"""
+    encoding = get_encoding(model_name)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+class RateLimiter:
+    """Thread-safe sliding-window limit on requests and tokens per minute"""
+    
+    def __init__(self, max_rpm: int, max_tpm: int, period: float = 60.0):
+        self.max_rpm = max_rpm
+        self.max_tpm = max_tpm
+        self.period = period
+        self._events = deque()  # (timestamp, tokens) of requests in the window
+        self._tokens = 0
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens: int) -> float:
+        """Reserve capacity for a request, returning 0 or the seconds to wait first"""
+        tokens = min(tokens, self.max_tpm)
+        with self._lock:
+            now = time.monotonic()
+            while self._events and now - self._events[0][0] >= self.period:
+                self._tokens -= self._events.popleft()[1]
+            
+            if len(self._events) < self.max_rpm and self._tokens + tokens <= self.max_tpm:
+                self._events.append((now, tokens))
+                self._tokens += tokens
+                return 0
+            
+            # Wait for the oldest request to leave the window
+            return self.period - (now - self._events[0][0])
+    
+    def acquire(self, tokens: int) -> None:
+        """
+        Block until a request of the given size fits in the current window
+        
+        Args:
+            tokens: Projected tokens (prompt + completion) for the request
+        """
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+    
+    async def aacquire(self, tokens: int) -> None:
+        """
+        Wait without blocking the event loop until a request of the given size fits
+        
+        Args:
+            tokens: Projected tokens (prompt + completion) for the request
+        """
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import Tuple, Optional, Callable, Any
+from typing import Tuple, Optional, Callable, Any, Iterator
 from src.langchain_pipeline.vector_store import VectorStoreService
 from src.langchain_pipeline.qa_chain import QuestionAnswerer
 from src.langchain_pipeline.summarizer import VideoSummarizer
@@ -18,7 +18,8 @@ class VideoProcessor:
         self.parallelization = max(1, min(5, value))  # Ensure it's between 1 and 5
     
     def process_video(self, video_url: str, duration_choice: str = "Full video", 
-                     progress_callback: Optional[Callable[[str, float, str, Optional[float]], Any]] = None) -> Tuple:
+                     progress_callback: Optional[Callable[[str, float, str, Optional[float]], Any]] = None,
+                     parallelization: Optional[int] = None) -> Tuple:
         """
         Process a YouTube video and create a searchable database
         
@@ -26,16 +27,21 @@ class VideoProcessor:
             video_url: YouTube video URL
             duration_choice: How much of the video to process
             progress_callback: Function to report progress
+            parallelization: Concurrent requests for this video (the instance
+                setting if None); passed per call since the processor is shared
             
         Returns:
             Tuple of (vector database, audio size in MB)
         """
+        if parallelization is None:
+            parallelization = self.parallelization
+        
         # Pass the parallelization setting to the vector store service
         return self.vector_store.create_vector_db_from_youtube_url(
             video_url, 
             duration_choice=duration_choice,
             progress_callback=progress_callback,
-            parallelization=self.parallelization
+            parallelization=max(1, min(5, parallelization))  # Ensure it's between 1 and 5
         )
     
     def answer_question(self, db, query: str, k: int = 4, model_name: str = None):
@@ -51,12 +57,59 @@ class VideoProcessor:
         Returns:
             Tuple of (answer, relevant document chunks)
         """
+        # Retrieve once so the fallback path doesn't repeat the embedding + search
+        relevant_docs = self.qa_service.retrieve_documents(db, query, k=k)
+        
         try:
-            return self.qa_service.answer_question(db, query, k=k, model_name=model_name)
+            return self.qa_service.answer_question(db, query, k=k, model_name=model_name,
+                                                   docs=relevant_docs)
         except Exception as e:
             # Fallback to simpler method if standard method fails
             print(f"Standard QA failed: {e}, falling back to simple answer")
-            return self.qa_service.simple_answer(db, query, model_name=model_name)
+            return self.qa_service.simple_answer(db, query, model_name=model_name,
+                                                 docs=relevant_docs)
+    
+    def answer_question_stream(self, db, query: str, k: int = 4, model_name: str = None):
+        """
+        Answer a question about the video, streaming the answer text
+        
+        Args:
+            db: Vector database
+            query: User's question
+            k: Number of chunks to use for context
+            model_name: LLM model to use
+            
+        Returns:
+            Tuple of (iterator of answer text chunks, relevant document chunks)
+        """
+        # Retrieve once so the fallback path doesn't repeat the embedding + search
+        relevant_docs = self.qa_service.retrieve_documents(db, query, k=k)
+        
+        try:
+            token_stream, used_docs = self.qa_service.answer_question_stream(
+                db, query, k=k, model_name=model_name, docs=relevant_docs
+            )
+        except Exception as e:
+            print(f"Standard QA failed: {e}, falling back to simple answer")
+            answer, used_docs = self.qa_service.simple_answer(db, query, model_name=model_name,
+                                                              docs=relevant_docs)
+            return iter([answer]), used_docs
+        
+        def stream_with_fallback():
+            # Fall back to simpler method if the stream fails before producing any text
+            streamed = False
+            try:
+                for token in token_stream:
+                    streamed = True
+                    yield token
+            except Exception as e:
+                if streamed:
+                    raise
+                print(f"Standard QA failed: {e}, falling back to simple answer")
+                yield self.qa_service.simple_answer(db, query, model_name=model_name,
+                                                    docs=relevant_docs)[0]
+        
+        return stream_with_fallback(), used_docs
     
     def summarize_video(self, db, model_name: str = None, summary_length: str = "Moderate"):
         """
@@ -70,4 +123,18 @@ class VideoProcessor:
         Returns:
             Summary text
         """
-        return self.summarizer.summarize(db, model_name=model_name, summary_length=summary_length)
\ No newline at end of file
+        return self.summarizer.summarize(db, model_name=model_name, summary_length=summary_length)
+    
+    def summarize_video_stream(self, db, model_name: str = None, summary_length: str = "Moderate") -> Iterator[str]:
+        """
+        Generate a summary of the video, streaming the summary text
+        
+        Args:
+            db: Vector database
+            model_name: LLM model to use
+            summary_length: Desired length of summary
+            
+        Returns:
+            Iterator of summary text chunks
+        """
+        return self.summarizer.summarize_stream(db, model_name=model_name, summary_length=summary_length)
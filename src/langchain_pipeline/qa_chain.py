@@ -1,80 +1,153 @@
+import re
+import numpy as np
 from langchain.llms import OpenAI
-from langchain.chains import LLMChain
-from langchain import PromptTemplate
-from typing import Tuple, List, Optional
+from typing import Tuple, List, Optional, Iterator
 from langchain.schema import Document
-from src.config.settings import OPENAI_API_KEY, DEFAULT_QA_MODEL
+from src.config.settings import DEFAULT_QA_MODEL, QA_RELEVANCE_THRESHOLD
+from src.langchain_pipeline.llm import get_llm, get_encoding
+
+# Prompts are plain format strings rendered once per call and sent straight to the LLM.
+# Static instructions come first and the per-request content last, so repeated
+# calls share the longest possible prompt prefix for provider-side caching.
+QA_PROMPT = """
+            You are a helpful assistant that can answer questions about YouTube videos 
+            based on the video's transcript.
+
+            Only use the factual information from the transcript to answer the question.
+            If you feel like you don't have enough information to answer the question, say "I don't know".
+            Your answers should be detailed but concise.
+
+            Video transcript: {docs}
+
+            Answer the following question: {question}
+            """
+
+SIMPLE_QA_PROMPT = """
+            Answer the question briefly, based on the transcript excerpts.
+            Keep your answer concise and factual.
+
+            Transcript excerpts: {docs}
+
+            Question: {question}
+            """
 
 class QuestionAnswerer:
     """Handles question answering about video content"""
     
-    def answer_question(self, db, query: str, k: int = 4, 
-                      model_name: str = DEFAULT_QA_MODEL) -> Tuple[str, List[Document]]:
+    def retrieve_documents(self, db, query: str, k: int = 4) -> List[Document]:
         """
-        Answer a question based on video content
+        Retrieve the chunks most relevant to a question
         
         Args:
             db: Vector database containing video content
             query: Question to answer
             k: Number of chunks to retrieve
-            model_name: LLM model to use
             
         Returns:
-            Tuple containing answer text and relevant document chunks
+            List of relevant document chunks
         """
-        # For very specific queries, use similarity search with relevance scores
+        # Over-fetch candidates with relevance scores, then keep only those above
+        # the threshold so weakly related chunks don't cost prompt tokens
         try:
-            docs_with_scores = db.similarity_search_with_relevance_scores(query, k=k*2)
+            docs_with_scores = db.similarity_search_with_relevance_scores(query, k=k*3)
+            scores = np.fromiter((score for _, score in docs_with_scores), dtype=np.float32,
+                                 count=len(docs_with_scores))
             
-            # Filter to docs with relevance above threshold
-            threshold = 0.7
-            relevant_docs = [doc for doc, score in docs_with_scores if score > threshold]
+            # Keep the k most relevant docs above the threshold; if nothing clears
+            # it, still answer from the best match
+            selected = np.flatnonzero(scores >= QA_RELEVANCE_THRESHOLD)[:k]
+            if selected.size == 0:
+                selected = np.arange(min(1, scores.size))
             
-            # If we have too few relevant docs, fall back to regular similarity search
-            if len(relevant_docs) < k:
-                relevant_docs = [doc for doc, _ in docs_with_scores[:k]]
-            else:
-                # Keep only the k most relevant
-                relevant_docs = relevant_docs[:k]
+            relevant_docs = [docs_with_scores[i][0] for i in selected.tolist()]
                 
         except Exception as e:
             # Fallback to standard similarity search if relevance search fails
             print(f"Relevance search failed: {e}, falling back to standard search")
             relevant_docs = db.similarity_search(query, k=k)
         
-        # TOKEN LIMIT HANDLING: Calculate estimated tokens for context
-        # Conservative estimate - 1 token ≈ 4 chars
-        context_text = " ".join([d.page_content for d in relevant_docs])
-        estimated_tokens = len(context_text) // 4
+        return relevant_docs
+    
+    def answer_question(self, db, query: str, k: int = 4, 
+                      model_name: str = DEFAULT_QA_MODEL,
+                      docs: Optional[List[Document]] = None) -> Tuple[str, List[Document]]:
+        """
+        Answer a question based on video content
         
-        # If estimated tokens exceed limits, reduce context intelligently
-        max_context_tokens = 3000  # Leave room for prompt and completion
+        Args:
+            db: Vector database containing video content
+            query: Question to answer
+            k: Number of chunks to retrieve
+            model_name: LLM model to use
+            docs: Previously retrieved chunks to reuse instead of searching again
+            
+        Returns:
+            Tuple containing answer text and relevant document chunks
+        """
+        relevant_docs = docs if docs is not None else self.retrieve_documents(db, query, k=k)
+        llm, prompt_text, relevant_docs = self._prepare_answer(query, relevant_docs, model_name)
         
-        if estimated_tokens > max_context_tokens:
-            # Try with fewer documents first
-            if len(relevant_docs) > 2:
-                # Just use the 2 most relevant docs
-                relevant_docs = relevant_docs[:2]
-                context_text = " ".join([d.page_content for d in relevant_docs])
-                estimated_tokens = len(context_text) // 4
-        
-        # If still too large, truncate each document
-        if estimated_tokens > max_context_tokens:
-            # Calculate how much we need to trim
-            total_chars = len(context_text)
-            target_chars = max_context_tokens * 4
-            ratio = target_chars / total_chars
+        return llm.invoke(prompt_text), relevant_docs
+    
+    def answer_question_stream(self, db, query: str, k: int = 4, 
+                             model_name: str = DEFAULT_QA_MODEL,
+                             docs: Optional[List[Document]] = None) -> Tuple[Iterator[str], List[Document]]:
+        """
+        Answer a question based on video content, streaming the answer as it is generated
+        
+        Args:
+            db: Vector database containing video content
+            query: Question to answer
+            k: Number of chunks to retrieve
+            model_name: LLM model to use
+            docs: Previously retrieved chunks to reuse instead of searching again
             
-            # Truncate each document proportionally
-            truncated_docs = []
-            for doc in relevant_docs:
-                content_len = len(doc.page_content)
-                # Keep at least the first 20% of each document
-                keep_chars = max(int(content_len * ratio), int(content_len * 0.2))
-                truncated_content = doc.page_content[:keep_chars]
-                truncated_docs.append(truncated_content)
-                
-            context_text = " ".join(truncated_docs)
+        Returns:
+            Tuple containing an iterator of answer text chunks and relevant document chunks
+        """
+        relevant_docs = docs if docs is not None else self.retrieve_documents(db, query, k=k)
+        llm, prompt_text, relevant_docs = self._prepare_answer(query, relevant_docs, model_name)
+        
+        return llm.stream(prompt_text), relevant_docs
+    
+    def _prepare_answer(self, query: str, relevant_docs: List[Document],
+                        model_name: str) -> Tuple[OpenAI, str, List[Document]]:
+        """
+        Fit retrieved chunks into the context budget and build the LLM and prompt
+        
+        Args:
+            query: Question to answer
+            relevant_docs: Retrieved document chunks
+            model_name: LLM model to use
+            
+        Returns:
+            Tuple of (llm, rendered prompt, document chunks used)
+        """
+        # TOKEN LIMIT HANDLING: Work out how many tokens of each doc fit the budget
+        max_context_tokens = 3000  # Leave room for prompt and completion
+        encoding = get_encoding(model_name)
+        doc_tokens = [encoding.encode(d.page_content) for d in relevant_docs]
+        lengths = np.fromiter((len(t) for t in doc_tokens), dtype=np.int64, count=len(doc_tokens))
+        keep_tokens = lengths
+        
+        if lengths.sum() > max_context_tokens and len(relevant_docs) > 2:
+            # Try with fewer documents first - just use the 2 most relevant docs
+            relevant_docs = relevant_docs[:2]
+            doc_tokens = doc_tokens[:2]
+            lengths = keep_tokens = lengths[:2]
+        
+        if lengths.sum() > max_context_tokens:
+            # Truncate each document proportionally, keeping at least the first 20%
+            keep_tokens = np.maximum(lengths * max_context_tokens // lengths.sum(), lengths // 5)
+            
+            if keep_tokens.sum() > max_context_tokens:
+                # Extreme fallback - just use small excerpts (first ~75 tokens) from each document
+                keep_tokens = np.minimum(lengths, 75)
+        
+        context_text = " ".join(
+            doc.page_content if keep == len(tokens) else encoding.decode(tokens[:keep])
+            for doc, tokens, keep in zip(relevant_docs, doc_tokens, keep_tokens.tolist())
+        )
         
         # Use model-specific settings
         if "gpt-4" in model_name:
@@ -84,44 +157,13 @@ class QuestionAnswerer:
             temperature = 0
             max_tokens = 500
         
-        llm = OpenAI(
-            model=model_name, 
-            temperature=temperature, 
-            max_tokens=max_tokens,
-            openai_api_key=OPENAI_API_KEY
-        )
+        llm = get_llm(model_name, temperature, max_tokens)
         
-        prompt = PromptTemplate(
-            input_variables=["question", "docs"],
-            template="""
-            You are a helpful assistant that can answer questions about YouTube videos 
-            based on the video's transcript.
-
-            Answer the following question: {question}
-            By searching the following video transcript: {docs}
-
-            Only use the factual information from the transcript to answer the question.
-            If you feel like you don't have enough information to answer the question, say "I don't know".
-            Your answers should be detailed but concise.
-            """
-        )
-        
-        # Final check - if still too large, use an even more aggressive approach
-        if len(context_text) // 4 > max_context_tokens:
-            # Extreme fallback - just use small excerpts from each document
-            excerpts = []
-            for doc in relevant_docs:
-                # Take first 300 chars of each document
-                excerpts.append(doc.page_content[:300])
-            context_text = " ".join(excerpts)
-        
-        chain = LLMChain(llm=llm, prompt=prompt)
-        response = chain.run(question=query, docs=context_text)
-        
-        return response, relevant_docs
+        return llm, QA_PROMPT.format(question=query, docs=context_text), relevant_docs
     
     def simple_answer(self, db, query: str, 
-                    model_name: str = DEFAULT_QA_MODEL) -> Tuple[str, List[Document]]:
+                    model_name: str = DEFAULT_QA_MODEL,
+                    docs: Optional[List[Document]] = None) -> Tuple[str, List[Document]]:
         """
         Simplified version for very long videos - uses minimal context
         
@@ -129,56 +171,63 @@ class QuestionAnswerer:
             db: Vector database containing video content
             query: Question to answer
             model_name: LLM model to use
+            docs: Previously retrieved chunks to reuse instead of searching again
             
         Returns:
             Tuple containing answer text and relevant document chunks
         """
         # Get just 2 most relevant chunks
-        docs = db.similarity_search(query, k=2)
+        if docs is not None:
+            docs = docs[:2]
+        else:
+            docs = db.similarity_search(query, k=2)
+        
+        # Match all query terms in one pass over each document
+        query_terms = sorted(set(query.lower().split()), key=len, reverse=True)
+        term_pattern = re.compile("|".join(re.escape(t) for t in query_terms), re.IGNORECASE) if query_terms else None
         
         # Extract very short snippets
         snippets = []
         for doc in docs:
-            # Find sentences that might contain the answer
-            content = doc.page_content.lower()
-            query_terms = query.lower().split()
-            
-            # Find a relevant excerpt
-            best_pos = 0
-            max_matches = 0
-            
-            # Simple sliding window to find most relevant section
-            for i in range(0, len(content), 50):
-                window = content[i:i+300]
-                matches = sum(1 for term in query_terms if term in window)
-                if matches > max_matches:
-                    max_matches = matches
-                    best_pos = i
-            
-            # Take excerpt around the best position
+            # Find the most relevant section and take an excerpt around it
+            best_pos = self._best_window_position(doc.page_content, term_pattern)
             start_pos = max(0, best_pos - 50)
             excerpt = doc.page_content[start_pos:start_pos+250]
             snippets.append(excerpt)
         
         context = " ".join(snippets)
         
-        llm = OpenAI(
-            model=model_name, 
-            temperature=0, 
-            max_tokens=300,
-            openai_api_key=OPENAI_API_KEY
-        )
+        llm = get_llm(model_name, 0, 300)
+        response = llm.invoke(SIMPLE_QA_PROMPT.format(question=query, docs=context))
         
-        prompt = PromptTemplate(
-            input_variables=["question", "docs"],
-            template="""
-            Answer this question briefly: {question}
-            Based on these transcript excerpts: {docs}
-            Keep your answer concise and factual.
-            """
-        )
+        return response, docs
+    
+    @staticmethod
+    def _best_window_position(content: str, term_pattern: Optional[re.Pattern],
+                              window: int = 300, stride: int = 50) -> int:
+        """
+        Find the start of the window with the most query term hits
+        
+        Args:
+            content: Text to search
+            term_pattern: Compiled alternation of the query terms
+            window: Window size in characters
+            stride: Step between window starts
+            
+        Returns:
+            Start position of the best window (0 if nothing matches)
+        """
+        if term_pattern is None or not content:
+            return 0
+        
+        hits = np.fromiter((m.start() for m in term_pattern.finditer(content)), dtype=np.int64)
+        if hits.size == 0:
+            return 0
         
-        chain = LLMChain(llm=llm, prompt=prompt)
-        response = chain.run(question=query, docs=context)
+        # Bucket hits by stride, then sum adjacent buckets to score each window
+        buckets_per_window = window // stride
+        num_windows = (len(content) + stride - 1) // stride
+        counts = np.bincount(hits // stride, minlength=num_windows + buckets_per_window - 1)
+        window_hits = np.convolve(counts, np.ones(buckets_per_window, dtype=np.int64), "valid")
         
-        return response, docs
\ No newline at end of file
+        return int(np.argmax(window_hits[:num_windows])) * stride
@@ -1,8 +1,53 @@
-from langchain.llms import OpenAI
-from langchain.chains import LLMChain
-from langchain import PromptTemplate
-from typing import List, Dict, Any, Optional
-from src.config.settings import OPENAI_API_KEY, DEFAULT_SUMMARY_MODEL
+import asyncio
+import io
+from langchain.globals import get_llm_cache
+from langchain.schema import Document, Generation
+from openai import AsyncOpenAI, RateLimitError
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from src.config.settings import (
+    OPENAI_API_KEY,
+    DEFAULT_SUMMARY_MODEL,
+    MAX_CONCURRENT_REQUESTS,
+    SUMMARY_MAX_RPM,
+    SUMMARY_MAX_TPM
+)
+from src.langchain_pipeline.llm import get_llm, get_encoding, count_tokens, truncate_to_tokens, RateLimiter
+
+# Prompts are plain format strings sent straight to the LLM / SDK
+SUMMARY_PROMPT = """
+                Summarize the following video transcript in a clear, concise way. Focus on the main ideas, important moments, and relevant discussion points.
+
+                Transcript:
+                {docs}
+
+                Summary:
+                """
+
+CHUNK_SUMMARY_PROMPT = """
+            Briefly summarize this section of a video transcript in 2-3 sentences:
+            {docs}
+            
+            Very brief summary:
+            """
+
+REDUCE_PROMPT = """
+            Below are summaries from different parts of a video. Create a coherent overall summary 
+            that captures the main points and narrative of the entire video:
+            
+            {summaries}
+            
+            Overall video summary:
+            """
+
+# Shared across requests so concurrent summaries stay within the account's limits
+_map_rate_limiter = RateLimiter(SUMMARY_MAX_RPM, SUMMARY_MAX_TPM)
+
+# Static query used to pull representative chunks for a summary
+SUMMARY_QUERY = "summary"
+
+def _search_summary_chunks(db, k: int) -> List[Document]:
+    """Find chunks for the summary query (the store's query embeddings are memoized)"""
+    return db.similarity_search(SUMMARY_QUERY, k=k)
 
 class VideoSummarizer:
     """Handles summarization of video content"""
@@ -20,6 +65,55 @@ class VideoSummarizer:
         Returns:
             A summary of the video content
         """
+        prompt, max_tokens, fallback = self._prepare_summary(db, model_name, summary_length)
+        
+        # invoke (unlike stream) goes through the LLM response cache
+        try:
+            summary = get_llm(model_name, 0.3, max_tokens).invoke(prompt)
+        except Exception:
+            if fallback is None:
+                raise
+            summary = fallback
+        return " ".join(summary.split())
+    
+    def summarize_stream(self, db, model_name: str = DEFAULT_SUMMARY_MODEL, 
+                       summary_length: str = "Moderate") -> Iterator[str]:
+        """
+        Summarize video content, yielding the final summary as it is generated
+        
+        Args:
+            db: The Chroma vector database
+            model_name: The OpenAI model to use
+            summary_length: 'Brief', 'Moderate', or 'Detailed'
+        
+        Yields:
+            Chunks of summary text
+        """
+        prompt, max_tokens, fallback = self._prepare_summary(db, model_name, summary_length)
+        
+        streamed = False
+        try:
+            for token in get_llm(model_name, 0.3, max_tokens).stream(prompt):
+                streamed = True
+                yield token
+        except Exception:
+            if streamed or fallback is None:
+                raise
+            yield fallback
+    
+    def _prepare_summary(self, db, model_name: str, summary_length: str) -> Tuple[str, int, Optional[str]]:
+        """
+        Gather the context for a summary and build the final prompt
+        
+        Args:
+            db: The Chroma vector database
+            model_name: The OpenAI model to use
+            summary_length: 'Brief', 'Moderate', or 'Detailed'
+        
+        Returns:
+            Tuple of (final prompt, max tokens for the summary, text to return if
+            the final call fails, or None to raise)
+        """
         # Determine how many chunks to retrieve based on desired length
         if summary_length == "Brief":
             k = 5
@@ -32,52 +126,68 @@ class VideoSummarizer:
             max_tokens = 250
             
         # Check if we need to use a map-reduce approach (many chunks)
-        total_chunks = len(db.get()['ids']) if hasattr(db, 'get') and callable(db.get) else 100
+        total_chunks = self._chunk_count(db)
         
-        if total_chunks > 20:
-            return self._map_reduce_summarize(db, model_name, max_tokens, summary_length)
-        else:
+        if total_chunks <= 20:
             # Standard approach for shorter videos
-            all_docs = db.similarity_search("summary", k=k)
-            context = " ".join([d.page_content for d in all_docs])
-
-            # Check if context is too large (conservative estimate - 1 token ≈ 4 chars)
-            estimated_tokens = len(context) // 4
-            if estimated_tokens > 3000:  # Leave buffer for prompt and completion
-                return self._map_reduce_summarize(db, model_name, max_tokens, summary_length)
+            all_docs = _search_summary_chunks(db, k)
+            context = " ".join(d.page_content for d in all_docs)
 
-            llm = OpenAI(model=model_name, temperature=0.3, max_tokens=max_tokens, openai_api_key=OPENAI_API_KEY)
-            prompt = PromptTemplate(
-                input_variables=["docs"],
-                template="""
-                Summarize the following video transcript in a clear, concise way. Focus on the main ideas, important moments, and relevant discussion points.
-
-                Transcript:
-                {docs}
-
-                Summary:
-                """
-            )
-
-            chain = LLMChain(llm=llm, prompt=prompt)
-            summary = chain.run(docs=context)
-            return " ".join(summary.split())
+            # Use it unless the context is too large (leave buffer for prompt and completion)
+            if count_tokens(context, model_name) <= 3000:
+                return SUMMARY_PROMPT.format(docs=context), max_tokens, None
+        
+        prompt, fallback = self._map_reduce_prompt(db, model_name, summary_length, total_chunks)
+        return prompt, max_tokens, fallback
 
-    def _map_reduce_summarize(self, db, model_name: str, max_tokens: int, summary_length: str) -> str:
+    @staticmethod
+    def _chunk_count(db) -> int:
+        """Count chunks in the database without materializing every id"""
+        try:
+            return db._collection.count()
+        except AttributeError:
+            # Not a Chroma store; assume a long video rather than scanning every row
+            return 100
+    
+    @staticmethod
+    def _ordered_documents(db) -> List[Document]:
+        """
+        Fetch every chunk in transcript order with a single collection read
+        
+        Args:
+            db: The Chroma vector database
+            
+        Returns:
+            Documents ordered by their chunk index (insertion order for
+            databases built before chunk indexes were stored)
+        """
+        result = db.get(include=["documents", "metadatas"])
+        metadatas = result.get("metadatas") or [None] * len(result["documents"])
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"], metadatas)
+        ]
+        
+        if all("chunk" in doc.metadata for doc in docs):
+            docs.sort(key=lambda doc: doc.metadata["chunk"])
+        return docs
+    
+    def _map_reduce_prompt(self, db, model_name: str, summary_length: str,
+                           total_chunks: int) -> Tuple[str, str]:
         """
         Map-reduce approach for summarizing very long videos:
         1. Get several sample chunks from throughout the video
         2. Summarize each chunk independently
-        3. Combine those summaries into an overall summary
+        3. Build the prompt that combines those summaries into an overall summary
         
         Args:
             db: The Chroma vector database
             model_name: The OpenAI model to use
-            max_tokens: Maximum tokens for the final summary
             summary_length: Desired summary length
+            total_chunks: Number of chunks in the database
             
         Returns:
-            A summary of the video content
+            Tuple of (reduce prompt, text to return if the reduce call fails)
         """
         # Set sample size based on summary length
         if summary_length == "Brief":
@@ -87,9 +197,6 @@ class VideoSummarizer:
         else:  # Moderate
             sample_size = 15
         
-        # Determine total chunks
-        total_chunks = len(db.get()['ids']) if hasattr(db, 'get') and callable(db.get) else 100
-        
         # Calculate positions to sample (evenly distributed)
         sample_positions = []
         if total_chunks <= sample_size:
@@ -99,106 +206,131 @@ class VideoSummarizer:
             step = max(1, total_chunks // sample_size)
             sample_positions = list(range(0, total_chunks, step))[:sample_size]
         
-        # Collect documents from these positions
-        sampled_docs = []
-        for i, pos in enumerate(sample_positions):
-            query = f"position:{pos}"  # Just a placeholder query
-            # Use i as a fallback in case pos is out of range
-            results = db.similarity_search(query, k=1)
-            if results:
-                sampled_docs.append(results[0])
+        # Collect documents from these positions directly (no embedding or search)
+        ordered_docs = self._ordered_documents(db)
+        sampled_docs = [ordered_docs[pos] for pos in sample_positions if pos < len(ordered_docs)]
         
         # Ensure we have at least some documents
         if not sampled_docs and total_chunks > 0:
             # Fallback to just getting some documents with a generic query
-            sampled_docs = db.similarity_search("summary", k=min(sample_size, total_chunks))
+            sampled_docs = _search_summary_chunks(db, min(sample_size, total_chunks))
         
-        # Initialize OpenAI client with conservative token limits
-        llm = OpenAI(model=model_name, temperature=0.3, max_tokens=100, openai_api_key=OPENAI_API_KEY)
+        # Map: Summarize each chunk concurrently with very tight token constraints
+        chunk_summaries = asyncio.run(self._summarize_chunks(sampled_docs, model_name))
+        if not chunk_summaries:
+            # A reduce over nothing would only invent a summary
+            raise RuntimeError("Could not summarize any part of the video")
         
-        # Map: Summarize each chunk with very tight token constraints
-        chunk_summaries = []
-        chunk_prompt = PromptTemplate(
-            input_variables=["docs"],
-            template="""
-            Briefly summarize this section of a video transcript in 2-3 sentences:
-            {docs}
+        # Reduce: Combine whole summaries until the token budget is reached, so
+        # the context never needs truncating mid-sentence afterwards
+        encoding = get_encoding(model_name)
+        max_context_tokens = 3000  # Conservative limit
+        running_tokens = 0
+        buffer = io.StringIO()
+        for summary in chunk_summaries:
+            summary_tokens = len(encoding.encode(summary)) + 1  # Separator
+            if running_tokens + summary_tokens > max_context_tokens:
+                break
+            buffer.write(summary)
+            buffer.write(" ")
+            running_tokens += summary_tokens
+        combined_context = buffer.getvalue().rstrip()
+        
+        # Fallback with even shorter content if the final call still hits token limits
+        fallback = f"This video is extremely long and contains too much content for a complete summary. Here are key points from parts of the video: {combined_context[:2000]}..."
+        return REDUCE_PROMPT.format(summaries=combined_context), fallback
+    
+    async def _summarize_chunks(self, docs: List[Any], model_name: str) -> List[str]:
+        """
+        Summarize sampled chunks concurrently for the map step
+        
+        Args:
+            docs: Sampled documents to summarize
+            model_name: The OpenAI model to use
             
-            Very brief summary:
-            """
-        )
-        
-        chunk_chain = LLMChain(llm=llm, prompt=chunk_prompt)
-        
-        # Process each document with error handling
-        for doc in sampled_docs:
-            try:
-                # Truncate document if it's too large (approximate 3000 token limit ≈ 12000 chars)
-                content = doc.page_content
-                if len(content) > 12000:
-                    content = content[:12000] + "..."
-                    
-                summary = chunk_chain.run(docs=content)
-                chunk_summaries.append(summary.strip())
-            except Exception as e:
-                # If we hit an error, use a shorter chunk and try again
-                try:
-                    shorter_content = doc.page_content[:6000] + "..."
-                    summary = chunk_chain.run(docs=shorter_content)
-                    chunk_summaries.append(summary.strip())
-                except:
-                    # If still failing, just skip this chunk
-                    continue
-        
-        # If we have too many summaries, combine them in batches
-        if len(chunk_summaries) > 20:
-            # Combine into batches of 5
-            batch_size = 5
-            batched_summaries = []
-            for i in range(0, len(chunk_summaries), batch_size):
-                batch = chunk_summaries[i:i+batch_size]
-                batched_summaries.append(" ".join(batch))
-            chunk_summaries = batched_summaries
-        
-        # Reduce: Combine the summaries with appropriate token limits
-        combined_context = " ".join(chunk_summaries)
-        
-        # Final summarization
-        reduce_prompt = PromptTemplate(
-            input_variables=["summaries"],
-            template="""
-            Below are summaries from different parts of a video. Create a coherent overall summary 
-            that captures the main points and narrative of the entire video:
+        Returns:
+            Chunk summaries in document order (failed chunks are skipped)
+        """
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        prompts = []
+        for doc in docs:
+            # Truncate upfront so each prompt always fits (3000 token limit)
+            content = truncate_to_tokens(doc.page_content, 3000, model_name)
+            if content != doc.page_content:
+                content += "..."
+            prompts.append(CHUNK_SUMMARY_PROMPT.format(docs=content))
+        
+        # Chunk summaries don't depend on the summary length, so look each prompt up
+        # in the LLM response cache under the same key get_llm's calls use and only
+        # send the misses
+        llm_cache = get_llm_cache()
+        by_prompt = {}
+        if llm_cache:
+            # Built the way BaseLLM keys its cache: the model's parameters plus stop words
+            params = get_llm(model_name, 0.3, 100).dict()
+            params["stop"] = None
+            llm_string = str(sorted(params.items()))
+            for prompt in prompts:
+                generations = llm_cache.lookup(prompt, llm_string)
+                if generations:
+                    by_prompt[prompt] = generations[0].text.strip()
+        misses = [prompt for prompt in dict.fromkeys(prompts) if prompt not in by_prompt]
+        
+        # Send the prompts as a few list-prompt requests, one per concurrent slot,
+        # so the map step uses a handful of requests per minute instead of one per chunk
+        batch_size = max(1, -(-len(misses) // MAX_CONCURRENT_REQUESTS))
+        batches = [misses[i:i+batch_size] for i in range(0, len(misses), batch_size)]
+        
+        async def complete(batch: List[str], max_attempts: int = 3) -> List[str]:
+            tokens = sum(count_tokens(prompt, model_name) + 100 for prompt in batch)
             
-            {summaries}
+            # Back off exponentially when rate limited
+            for attempt in range(max_attempts):
+                await _map_rate_limiter.aacquire(tokens)
+                try:
+                    response = await client.completions.create(
+                        model=model_name,
+                        prompt=batch,
+                        temperature=0.3,
+                        max_tokens=100
+                    )
+                    # Choices may arrive in any order; place them by prompt index
+                    summaries = [""] * len(batch)
+                    for choice in response.choices:
+                        summaries[choice.index] = choice.text.strip()
+                        if llm_cache and summaries[choice.index]:
+                            llm_cache.update(batch[choice.index], llm_string, [Generation(text=choice.text)])
+                    return summaries
+                except RateLimitError:
+                    if attempt == max_attempts - 1:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+        
+        async def summarize_batch(batch: List[str]) -> List[str]:
+            async with semaphore:
+                try:
+                    return await complete(batch)
+                except Exception:
+                    if len(batch) == 1:
+                        raise
             
-            Overall video summary:
-            """
-        )
-        
-        reduce_chain = LLMChain(
-            llm=OpenAI(model=model_name, temperature=0.3, max_tokens=max_tokens, openai_api_key=OPENAI_API_KEY),
-            prompt=reduce_prompt
-        )
-        
-        # Handle potential token limit for final reduction
-        if len(combined_context) > 12000:  # Conservative limit (approx 3000 tokens)
-            # Further reduce by taking only the beginning, middle and end of summaries
-            third = len(chunk_summaries) // 3
-            selected_summaries = (
-                chunk_summaries[:third] + 
-                chunk_summaries[third:2*third][:3] + 
-                chunk_summaries[2*third:]
-            )
-            combined_context = " ".join(selected_summaries)
-        
-        # Final check for length
-        if len(combined_context) > 12000:
-            combined_context = combined_context[:12000]
+            # Retry a failed batch one prompt at a time, so a failure only loses the
+            # chunks that fail on their own
+            results = await asyncio.gather(*[summarize_batch([prompt]) for prompt in batch],
+                                           return_exceptions=True)
+            return [result[0] if isinstance(result, list) else "" for result in results]
         
         try:
-            final_summary = reduce_chain.run(summaries=combined_context)
-            return final_summary.strip()
-        except Exception as e:
-            # Fallback with even shorter content if we still hit token limits
-            return f"This video is extremely long and contains too much content for a complete summary. Here are key points from parts of the video: {combined_context[:2000]}..."
\ No newline at end of file
+            results = await asyncio.gather(*[summarize_batch(batch) for batch in batches],
+                                           return_exceptions=True)
+        finally:
+            await client.close()
+        
+        for batch, result in zip(batches, results):
+            if isinstance(result, list):
+                by_prompt.update(zip(batch, result))
+        
+        # Skip chunks that failed even after backing off
+        return [by_prompt[prompt] for prompt in prompts if by_prompt.get(prompt)]
@@ -1,19 +1,117 @@
 import os
+import re
+import tempfile
+import asyncio
+import textwrap
+import uuid
+from bisect import bisect_left, bisect_right
 from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from typing import Tuple, Optional, Callable, Any
+from typing import Tuple, Optional, Callable, Any, List
 from src.utils.downloader import VideoDownloader
 from src.utils.audio_processor import AudioProcessor, get_file_size_mb
 from src.utils.transcription import TranscriptionService
-from src.config.settings import OPENAI_API_KEY, DB_DIR, MAX_CONCURRENT_REQUESTS
-from langchain.embeddings.openai import OpenAIEmbeddings
+from src.utils.cache_manager import file_sha256
+from src.config.settings import (
+    OPENAI_API_KEY,
+    DB_DIR,
+    MAX_CONCURRENT_REQUESTS,
+    EMBEDDINGS_MODEL,
+    EMBEDDINGS_DIMENSIONS,
+    EMBEDDING_BATCH_SIZE,
+    CHROMA_HNSW
+)
+from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
+from functools import lru_cache
+
+def format_snippet(text: str, max_chars: int = 500, width: int = 80) -> str:
+    """Truncate and wrap chunk text for display, computed once at ingest time"""
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return textwrap.fill(text, width=width)
+
+_SENTENCE_END_RE = re.compile(r"[.!?]\s+")
+
+def split_transcript(text: str, chunk_size: int = 5000, chunk_overlap: int = 500) -> List[str]:
+    """
+    Split a plain transcript into overlapping chunks on sentence boundaries
+    
+    Args:
+        text: Transcript text
+        chunk_size: Maximum characters per chunk
+        chunk_overlap: Approximate characters shared between consecutive chunks
+        
+    Returns:
+        List of chunk texts
+    """
+    # Sentence boundary offsets come from one C-level regex scan
+    boundaries = [m.end() for m in _SENTENCE_END_RE.finditer(text)]
+    boundaries.append(len(text))
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        limit = start + chunk_size
+        if limit >= len(text):
+            end = len(text)
+        else:
+            # End at the last sentence boundary that fits, else the last space
+            i = bisect_right(boundaries, limit) - 1
+            if i >= 0 and boundaries[i] > start:
+                end = boundaries[i]
+            else:
+                space = text.rfind(" ", start + 1, limit)
+                end = space + 1 if space != -1 else limit
+        
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        
+        # Start the next chunk at a sentence (or word) boundary within the overlap
+        overlap_start = max(end - chunk_overlap, start + 1)
+        j = bisect_left(boundaries, overlap_start)
+        if boundaries[j] < end:
+            start = boundaries[j]
+        else:
+            space = text.find(" ", overlap_start, end)
+            start = space + 1 if space != -1 else end
+    
+    return chunks
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that memoizes query embeddings for repeated questions"""
+    
+    def __init__(self, embeddings: Embeddings, maxsize: int = 1000):
+        self.embeddings = embeddings
+        self._embed_query_cached = lru_cache(maxsize=maxsize)(self._embed_query)
+    
+    def _embed_query(self, text: str) -> tuple:
+        return tuple(self.embeddings.embed_query(text))
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        # Normalize whitespace so trivially different queries share an entry
+        return list(self._embed_query_cached(" ".join(text.split())))
 
 class VectorStoreService:
     """Service for creating and managing vector stores from YouTube videos"""
     
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        self.embeddings = CachedQueryEmbeddings(OpenAIEmbeddings(
+            model=EMBEDDINGS_MODEL,
+            dimensions=EMBEDDINGS_DIMENSIONS,
+            openai_api_key=OPENAI_API_KEY,
+            chunk_size=EMBEDDING_BATCH_SIZE,  # Send each batch as a single request
+            max_retries=6,
+            request_timeout=60
+        ))
         self.downloader = VideoDownloader()
         self.audio_processor = AudioProcessor()
         self.transcription = TranscriptionService()
@@ -33,108 +131,148 @@ class VectorStoreService:
         Returns:
             Tuple of (vector database, audio size in MB)
         """
-        # Get video ID for caching
+        # Get video ID for caching; databases are kept per embedding model and size
+        # since vectors of another dimension cannot be queried together
         video_id = self.downloader.get_video_id(video_url)
-        db_path = os.path.join(DB_DIR, video_id)
+        db_path = str(DB_DIR / f"{EMBEDDINGS_MODEL}-{EMBEDDINGS_DIMENSIONS}" / video_id)
 
         # Check for existing processed database
         if os.path.exists(db_path):
-            db = Chroma(persist_directory=db_path, embedding_function=self.embeddings)
+            db = Chroma(persist_directory=db_path, embedding_function=self.embeddings,
+                        collection_metadata=CHROMA_HNSW)
             
             if progress_callback:
                 progress_callback("Database", 100, "Using existing vector database", 0)
                 
             return db, 0
         
-        # Download audio with progress updates
-        if progress_callback:
-            progress_callback("Download", 0, "Starting download", None)
-        
-        audio_path = self.downloader.download_audio(
-            video_url, 
-            progress_callback=progress_callback
-        )
-        
-        # Process audio with better progress updates
-        if progress_callback:
-            progress_callback("Processing", 0, "Preparing audio", None)
-        
-        compressed_audio_path = self.audio_processor.compress_audio(
-            audio_path, 
-            progress_callback=progress_callback
-        )
-        
-        # Handle duration choice if not full video
-        if duration_choice != "Full video":
+        # Each job works in its own directory, so videos processed at the same time
+        # never overwrite each other's audio; it is removed once transcribed
+        with tempfile.TemporaryDirectory(prefix=f"yt_{video_id}_") as work_dir:
+            # Download audio with progress updates
             if progress_callback:
-                progress_callback("Processing", 80, f"Trimming to {duration_choice}", None)
-                
-            processed_audio_path = self.audio_processor.process_audio_for_duration(
-                compressed_audio_path,
-                duration_choice=duration_choice
-            )
-        else:
-            processed_audio_path = compressed_audio_path
-        
-        # Transcribe audio - pass parallelization setting to the transcription service
-        if progress_callback:
-            progress_callback("Transcription", 0, "Preparing transcription", None)
-        
-        # Set segment size based on video length
-        segment_size_minutes = 5  # Default to 5-minute segments for parallelization
-        sound_duration_ms = AudioProcessor.get_audio_duration_ms(processed_audio_path)
-        sound_duration_minutes = sound_duration_ms / (60 * 1000)
-        
-        # For very long videos, use larger segments
-        if sound_duration_minutes > 180:  # > 3 hours
-            segment_size_minutes = 10
-        
-        # Custom function to pass parallelization to transcribe_audio_with_segments
-        def transcribe_with_parallelization(audio_path, video_id, progress_callback):
-            from src.utils.parallel_transcription import transcribe_with_parallelization as twp
-            return twp(
-                audio_path, 
-                video_id,
-                segment_size_minutes=segment_size_minutes,
-                max_concurrent=parallelization,
-                progress_callback=progress_callback
-            )
-        
-        # For longer videos, use parallel transcription
-        if sound_duration_minutes > 20:  # > 20 minutes
-            full_transcript = transcribe_with_parallelization(
-                processed_audio_path, 
-                video_id, 
-                progress_callback
-            )
-        else:
-            # For shorter videos, use standard transcription
-            full_transcript = self.transcription.transcribe_audio_with_segments(
-                processed_audio_path,
-                video_id,
-                progress_callback=progress_callback
+                progress_callback("Download", 0, "Starting download", None)
+            
+            # The download is extracted straight to compressed mono 16kHz audio
+            compressed_audio_path = self.downloader.download_audio(
+                video_url, 
+                output_path=os.path.join(work_dir, "audio"),
+                progress_callback=progress_callback,
+                compress=True
             )
+            
+            # Handle duration choice if not full video
+            if duration_choice != "Full video":
+                if progress_callback:
+                    progress_callback("Processing", 80, f"Trimming to {duration_choice}", None)
+                    
+                processed_audio_path = self.audio_processor.process_audio_for_duration(
+                    compressed_audio_path,
+                    output_path=os.path.join(work_dir, "clipped_audio.mp3"),
+                    duration_choice=duration_choice
+                )
+            else:
+                processed_audio_path = compressed_audio_path
+            
+            # Transcribe audio - pass parallelization setting to the transcription service
+            if progress_callback:
+                progress_callback("Transcription", 0, "Preparing transcription", None)
+            
+            # Set segment size based on video length
+            segment_size_minutes = 5  # Default to 5-minute segments for parallelization
+            sound_duration_ms = AudioProcessor.get_audio_duration_ms(processed_audio_path)
+            sound_duration_minutes = sound_duration_ms / (60 * 1000)
+            
+            # For very long videos, use larger segments
+            if sound_duration_minutes > 180:  # > 3 hours
+                segment_size_minutes = 10
+            
+            # Custom function to pass parallelization to transcribe_audio_with_segments
+            def transcribe_with_parallelization(audio_path, video_id, progress_callback):
+                from src.utils.parallel_transcription import transcribe_with_parallelization as twp
+                return twp(
+                    audio_path, 
+                    video_id,
+                    segment_size_minutes=segment_size_minutes,
+                    max_concurrent=parallelization,
+                    progress_callback=progress_callback
+                )
+            
+            # Key cached transcripts on the audio content, so a rebuilt database reuses
+            # them and different trims of the same video never share segments
+            transcript_key = f"{video_id}_{file_sha256(processed_audio_path)[:16]}"
+            
+            # For longer videos, use parallel transcription
+            if sound_duration_minutes > 20:  # > 20 minutes
+                full_transcript = transcribe_with_parallelization(
+                    processed_audio_path, 
+                    transcript_key, 
+                    progress_callback
+                )
+            else:
+                # For shorter videos, use standard transcription
+                full_transcript = self.transcription.transcribe_audio_with_segments(
+                    processed_audio_path,
+                    transcript_key,
+                    progress_callback=progress_callback
+                )
+            
+            audio_size_mb = get_file_size_mb(compressed_audio_path)
         
         # Create vector database
         if progress_callback:
             progress_callback("Creating Database", 0, "Creating vector database", None)
         
-        doc = Document(page_content=full_transcript)
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=5000, chunk_overlap=500)
-        docs = text_splitter.split_documents([doc])
-        
-        total_docs = len(docs)
-        for i, _ in enumerate(docs):
-            db_progress = ((i+1) / total_docs) * 100
-            if progress_callback:
-                progress_callback("Creating Database", db_progress, 
-                                f"Processing chunk {i+1}/{total_docs}", 
-                                (total_docs - i - 1) * 2)  # 2 seconds per chunk estimate
+        # Split the transcript text directly; the chunks go straight into the
+        # collection, so wrapping them in Documents would only copy them
+        texts = split_transcript(full_transcript, chunk_size=5000, chunk_overlap=500)
+        del full_transcript
+        embeddings = asyncio.run(
+            self._aembed_texts(texts, parallelization, progress_callback)
+        )
         
-        db = Chroma.from_documents(docs, self.embeddings, persist_directory=db_path)
+        db = Chroma(persist_directory=db_path, embedding_function=self.embeddings,
+                    collection_metadata=CHROMA_HNSW)
+        db._collection.add(
+            ids=[str(uuid.uuid4()) for _ in texts],
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=[{"chunk": i, "snippet": format_snippet(text)} for i, text in enumerate(texts)]
+        )
         db.persist()
         
         if progress_callback:
             progress_callback("Complete", 100, "Processing complete", 0)
         
-        return db, get_file_size_mb(compressed_audio_path)
\ No newline at end of file
+        return db, audio_size_mb
+    
+    async def _aembed_texts(self, texts: List[str], parallelization: int,
+                            progress_callback: Optional[Callable[[str, float, str, Optional[float]], Any]] = None) -> List[List[float]]:
+        """
+        Embed transcript chunks in concurrent batches
+        
+        Args:
+            texts: Chunk texts to embed
+            parallelization: Maximum number of in-flight embedding requests
+            progress_callback: Function to report progress
+            
+        Returns:
+            Embeddings in the same order as texts
+        """
+        batches = [texts[i:i+EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(max(1, parallelization))
+        completed = 0
+        
+        async def embed_batch(batch):
+            nonlocal completed
+            async with semaphore:
+                result = await self.embeddings.aembed_documents(batch)
+            
+            completed += 1
+            if progress_callback:
+                progress_callback("Creating Database", (completed / len(batches)) * 100,
+                                f"Embedded batch {completed}/{len(batches)}", None)
+            return result
+        
+        results = await asyncio.gather(*[embed_batch(b) for b in batches])
+        return [vector for batch in results for vector in batch]
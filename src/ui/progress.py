@@ -15,15 +15,17 @@ class ProgressState:
 class ProgressManager:
     """Manages progress display and tracking"""
     
+    BAR_WIDTH = 20
+    MIN_RENDER_INTERVAL = 0.1  # Seconds between redraws within a step (~10 Hz)
+    
     def __init__(self):
-        self.progress_bar = None
         self.status_container = None
         self.current_state = None
         self._start_time = time.time()
+        self._last_render = 0.0
     
     def initialize(self):
         """Initialize UI elements"""
-        self.progress_bar = st.progress(0)
         self.status_container = st.empty()
         return self
     
@@ -38,6 +40,8 @@ class ProgressManager:
             message: Status message to display
             remaining_seconds: Estimated time remaining
         """
+        previous_step = self.current_state.step if self.current_state else None
+        
         # Create progress state
         self.current_state = ProgressState(
             step=step,
@@ -47,33 +51,39 @@ class ProgressManager:
             start_time=time.time()
         )
         
-        # Update progress bar (ensure percentage is valid)
+        # Skip redraws of rapid updates within a step; step changes and
+        # completion are always shown
+        now = time.monotonic()
+        if (percentage < 100 and step == previous_step
+                and now - self._last_render < self.MIN_RENDER_INTERVAL):
+            return
+        self._last_render = now
+        
+        # Render progress bar as text (ensure percentage is valid)
         valid_percentage = max(0, min(100, percentage)) / 100
-        if self.progress_bar:
-            self.progress_bar.progress(valid_percentage)
+        filled = int(round(valid_percentage * self.BAR_WIDTH))
+        bar = "█" * filled + "░" * (self.BAR_WIDTH - filled)
         
         # Format status message
-        status = f"**{step}:** {percentage:.1f}%"
+        parts = [f"`{bar}` **{step}:** {percentage:.1f}%"]
         if message:
-            status += f" - {message}"
+            parts.append(f" - {message}")
         
         # Add time estimate if available
         if remaining_seconds is not None and remaining_seconds > 0:
             if remaining_seconds > 60:
                 mins = int(remaining_seconds // 60)
                 secs = int(remaining_seconds % 60)
-                status += f" (Est. remaining: {mins}m {secs}s)"
+                parts.append(f" (Est. remaining: {mins}m {secs}s)")
             else:
-                status += f" (Est. remaining: {int(remaining_seconds)}s)"
+                parts.append(f" (Est. remaining: {int(remaining_seconds)}s)")
         
-        # Update status display
+        # Update bar and status with a single write
         if self.status_container:
-            self.status_container.markdown(status)
+            self.status_container.markdown("".join(parts))
     
     def clear(self) -> None:
         """Clear progress display"""
-        if self.progress_bar:
-            self.progress_bar.empty()
         if self.status_container:
             self.status_container.empty()
         
@@ -1,9 +1,10 @@
 import os
 import asyncio
 import aiofiles
-from pydub import AudioSegment
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from src.config.settings import OPENAI_API_KEY
+from src.utils.audio_processor import AudioProcessor
 
 openai.api_key = OPENAI_API_KEY
 
@@ -14,15 +15,18 @@ def split_audio_into_chunks(input_path, chunk_minutes=10, output_dir="chunks"):
     Returns a list of chunk paths.
     """
     os.makedirs(output_dir, exist_ok=True)
-    sound = AudioSegment.from_file(input_path)
+    total_length = AudioProcessor.get_audio_duration_ms(input_path)
     chunk_length = chunk_minutes * 60 * 1000  # milliseconds
 
-    chunks = []
-    for i in range(0, len(sound), chunk_length):
-        chunk = sound[i:i + chunk_length]
-        chunk_path = os.path.join(output_dir, f"chunk_{i // chunk_length}.mp3")
-        chunk.export(chunk_path, format="mp3", bitrate="16k")
-        chunks.append(chunk_path)
+    starts = range(0, total_length, chunk_length)
+    chunks = [os.path.join(output_dir, f"chunk_{i // chunk_length}.mp3") for i in starts]
+
+    # Cut chunks with ffmpeg stream copy, several processes at a time
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(
+            lambda args: AudioProcessor.extract_segment(input_path, args[1], args[0], chunk_length),
+            zip(starts, chunks)
+        ))
 
     return chunks
 
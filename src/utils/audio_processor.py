@@ -1,13 +1,60 @@
 import os
+import re
 import subprocess
-from pydub import AudioSegment
-from typing import Optional, Callable, Any
-from src.config.settings import DEFAULT_BITRATE, LONG_VIDEO_BITRATE, LONG_VIDEO_THRESHOLD_MINUTES
+import time
+from functools import lru_cache
+from typing import Optional, Callable, Any, List
+from src.config.settings import DEFAULT_BITRATE, LONG_VIDEO_BITRATE, LONG_VIDEO_THRESHOLD_MINUTES, FFMPEG_PATH
+
+# Transcription-ready output (mono 16kHz, as OpenAI recommends), shared by every
+# encode so each call only appends its input, bitrate and output
+TRANSCRIPTION_AUDIO_ARGS = ("-vn", "-ac", "1", "-ar", "16000")
 
 def get_file_size_mb(path: str) -> float:
     """Calculate file size in megabytes"""
     return os.path.getsize(path) / (1024 * 1024)
 
+def run_ffmpeg_with_progress(args: List[str], duration_ms: int,
+                             on_progress: Optional[Callable[[float, Optional[float]], Any]] = None) -> int:
+    """
+    Run ffmpeg and report real encode progress from its -progress output
+    
+    Args:
+        args: ffmpeg arguments (inputs, options and output) after the global flags
+        duration_ms: Expected output duration, used to turn positions into percentages
+        on_progress: Called with (percentage, estimated seconds remaining)
+        
+    Returns:
+        ffmpeg's exit code
+    """
+    cmd = [FFMPEG_PATH, "-y", "-v", "error", "-nostats", "-progress", "pipe:1", *args]
+    start = time.monotonic()
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as proc:
+        # ffmpeg writes its encoded position about twice a second
+        for line in proc.stdout:
+            if not (on_progress and duration_ms > 0 and line.startswith("out_time_us=")):
+                continue
+            try:
+                percent = min(100.0, int(line[len("out_time_us="):]) / 1000 / duration_ms * 100)
+            except ValueError:
+                continue  # "N/A" before the first frame is written
+            if percent > 0:
+                elapsed = time.monotonic() - start
+                on_progress(percent, elapsed * (100 - percent) / percent)
+    return proc.returncode
+
+@lru_cache(maxsize=256)
+def _probe_duration_ms(path: str, size: int, mtime: float) -> int:
+    """Read the container duration in-process with PyAV; size and mtime key the cache to the file's contents"""
+    import av  # Deferred so importing this module does not load the FFmpeg libraries
+    with av.open(path) as container:
+        if container.duration is not None:
+            return int(container.duration / 1000)  # Microseconds
+        
+        # Some containers only report a per-stream duration
+        stream = container.streams.audio[0]
+        return int(stream.duration * stream.time_base * 1000)
+
 class AudioProcessor:
     """Handles audio processing operations"""
     
@@ -20,29 +67,124 @@ class AudioProcessor:
             audio_path: Path to audio file
             
         Returns:
-            Duration in milliseconds
+            Duration in milliseconds (0 if it cannot be determined)
         """
         try:
-            sound = AudioSegment.from_file(audio_path)
-            return len(sound)
+            # Read the duration from the container metadata without decoding;
+            # repeat lookups of an unchanged file are served from the cache
+            return _probe_duration_ms(audio_path, os.path.getsize(audio_path),
+                                      os.path.getmtime(audio_path))
         except Exception as e:
             print(f"Error getting audio duration: {e}")
-            # Fallback using ffprobe
-            try:
-                import subprocess
-                cmd = [
-                    "ffprobe", 
-                    "-v", "error", 
-                    "-show_entries", "format=duration", 
-                    "-of", "default=noprint_wrappers=1:nokey=1", 
-                    audio_path
-                ]
-                output = subprocess.check_output(cmd).decode('utf-8').strip()
-                duration_seconds = float(output)
-                return int(duration_seconds * 1000)
-            except:
-                # Return a default if everything fails
-                return 0
+            # Return a default if probing fails
+            return 0
+    
+    @staticmethod
+    def max_segment_ms(audio_path: str, max_size_mb: float = 24) -> Optional[int]:
+        """
+        Get the longest segment that stays under a size limit at the file's average bitrate
+        
+        Args:
+            audio_path: Path to audio file
+            max_size_mb: Size limit per segment in MB (kept under the API's 25MB)
+            
+        Returns:
+            Segment length in milliseconds, or None if the file has no measurable duration
+        """
+        # The average over the whole file holds for VBR too, unlike the nominal bitrate
+        duration_ms = AudioProcessor.get_audio_duration_ms(audio_path)
+        size = os.path.getsize(audio_path)
+        if not duration_ms or not size:
+            return None
+        return int(max_size_mb * 1024 * 1024 / size * duration_ms)
+    
+    @staticmethod
+    def is_transcription_ready(audio_path: str) -> bool:
+        """
+        Check whether audio is already mono 16kHz MP3, reading only stream metadata
+        
+        Args:
+            audio_path: Path to audio file
+            
+        Returns:
+            True if the file can be sent for transcription as-is
+        """
+        import av  # Deferred so importing this module does not load the FFmpeg libraries
+        try:
+            with av.open(audio_path) as container:
+                codec = container.streams.audio[0].codec_context
+                return codec.name == "mp3" and codec.channels == 1 and codec.sample_rate == 16000
+        except Exception:
+            return False
+    
+    @staticmethod
+    def select_bitrate(duration_minutes: float) -> str:
+        """
+        Pick the compression bitrate for a video length
+        
+        Args:
+            duration_minutes: Audio duration in minutes
+            
+        Returns:
+            Bitrate string such as "32k"
+        """
+        if duration_minutes > LONG_VIDEO_THRESHOLD_MINUTES:
+            return LONG_VIDEO_BITRATE  # Use low bitrate for longer videos
+        return DEFAULT_BITRATE  # Use standard bitrate for shorter videos
+    
+    @staticmethod
+    def extract_segment(input_path: str, output_path: str, start_ms: int = 0,
+                        duration_ms: Optional[int] = None) -> str:
+        """
+        Cut a segment out of an audio file with ffmpeg stream copy (no decode or re-encode),
+        encoding it only when the source can't be copied into the output format
+        
+        Args:
+            input_path: Path to input audio file
+            output_path: Path to save the segment
+            start_ms: Segment start in milliseconds
+            duration_ms: Segment length in milliseconds (to the end of the file if None)
+            
+        Returns:
+            Path to the segment file
+        """
+        AudioProcessor._cut_segment(input_path, output_path, start_ms, duration_ms)
+        return output_path
+    
+    @staticmethod
+    def extract_segment_bytes(input_path: str, start_ms: int = 0,
+                              duration_ms: Optional[int] = None) -> bytes:
+        """
+        Cut a segment out of an audio file into memory, without writing it to disk
+        
+        Args:
+            input_path: Path to input audio file
+            start_ms: Segment start in milliseconds
+            duration_ms: Segment length in milliseconds (to the end of the file if None)
+            
+        Returns:
+            The segment as MP3 bytes
+        """
+        return AudioProcessor._cut_segment(input_path, "pipe:1", start_ms, duration_ms)
+    
+    @staticmethod
+    def _cut_segment(input_path: str, output: str, start_ms: int, duration_ms: Optional[int]) -> bytes:
+        """Stream-copy (or, failing that, encode) a segment to an MP3 output, returning what ffmpeg wrote to stdout"""
+        cmd = [FFMPEG_PATH, "-y", "-v", "error", "-ss", f"{start_ms / 1000:.3f}"]
+        if duration_ms is not None:
+            cmd += ["-t", f"{duration_ms / 1000:.3f}"]
+        cmd += ["-i", input_path, "-vn"]
+        
+        copied = subprocess.run([*cmd, "-c:a", "copy", "-f", "mp3", output], stdout=subprocess.PIPE)
+        if copied.returncode == 0:
+            return copied.stdout
+        
+        # The source codec doesn't fit the output container (e.g. not MP3), so encode
+        # this segment to transcription-ready audio instead
+        return subprocess.run([
+            *cmd, *TRANSCRIPTION_AUDIO_ARGS[1:], "-c:a", "libmp3lame", "-b:a", DEFAULT_BITRATE,
+            "-f", "mp3", output
+        ], stdout=subprocess.PIPE, check=True).stdout
     
     @staticmethod
     def compress_audio(input_path: str, output_path: str = "compressed_audio.mp3", 
@@ -60,78 +202,34 @@ class AudioProcessor:
         Returns:
             Path to compressed audio file
         """
-        try:
-            sound = AudioSegment.from_file(input_path)
-            
-            # Determine video length in minutes
-            duration_minutes = len(sound) / (1000 * 60)
-            
-            # Select bitrate based on duration unless manually overridden
-            if override_bitrate:
-                bitrate = override_bitrate
-            else:
-                if duration_minutes > LONG_VIDEO_THRESHOLD_MINUTES:
-                    bitrate = LONG_VIDEO_BITRATE  # Use low bitrate for longer videos
-                else:
-                    bitrate = DEFAULT_BITRATE  # Use standard bitrate for shorter videos
-            
-            if progress_callback:
-                progress_callback("Audio Processing", 10, 
-                                 f"Video duration: {duration_minutes:.1f} minutes. Using {bitrate} bitrate.",
-                                 duration_minutes * 1.5)
-            
-            # Convert to mono (often more reliable for transcription)
-            sound = sound.set_channels(1)
-            if progress_callback:
-                progress_callback("Audio Processing", 30, "Converting to mono", duration_minutes * 1.0)
-            
-            # Set sample rate to 16kHz (OpenAI recommended)
-            sound = sound.set_frame_rate(16000)
-            if progress_callback:
-                progress_callback("Audio Processing", 50, "Setting sample rate", duration_minutes * 0.7)
-            
-            # Export with compression
-            if progress_callback:
-                progress_callback("Audio Processing", 70, "Compressing audio", duration_minutes * 0.5)
-                
-            sound.export(output_path, format="mp3", bitrate=bitrate, 
-                        parameters=["-ac", "1", "-ar", "16000"])
-            
-            if progress_callback:
-                progress_callback("Audio Processing", 100, "Compression complete", 0)
-            
-            return output_path
-        except Exception as e:
-            print(f"Error during audio compression: {e}")
-            # Fallback to direct ffmpeg conversion if pydub fails
-            
-            # Determine bitrate for fallback method
-            if not override_bitrate:
-                # We need to manually check duration for ffmpeg fallback
-                try:
-                    duration_cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", 
-                                  "-of", "default=noprint_wrappers=1:nokey=1", input_path]
-                    duration_output = subprocess.check_output(duration_cmd).decode('utf-8').strip()
-                    duration_minutes = float(duration_output) / 60
-                    bitrate = LONG_VIDEO_BITRATE if duration_minutes > LONG_VIDEO_THRESHOLD_MINUTES else DEFAULT_BITRATE
-                except:
-                    # If ffprobe fails, use default bitrate
-                    bitrate = DEFAULT_BITRATE
-            else:
-                bitrate = override_bitrate
-                
-            if progress_callback:
-                progress_callback("Audio Processing", 80, "Using fallback compression method", None)
-                
-            subprocess.run([
-                "ffmpeg", "-y", "-i", input_path, 
-                "-ac", "1", "-ar", "16000", "-b:a", bitrate, output_path
-            ])
+        # Determine video length in minutes from metadata (no decode)
+        duration_ms = AudioProcessor.get_audio_duration_ms(input_path)
+        duration_minutes = duration_ms / (1000 * 60)
+        
+        # Select bitrate based on duration unless manually overridden
+        bitrate = override_bitrate or AudioProcessor.select_bitrate(duration_minutes)
+        
+        if progress_callback:
+            progress_callback("Audio Processing", 0, 
+                             f"Video duration: {duration_minutes:.1f} minutes. Using {bitrate} bitrate.",
+                             None)
             
-            if progress_callback:
-                progress_callback("Audio Processing", 100, "Compression complete (fallback method)", 0)
-                
-            return output_path
+            def on_progress(percent, remaining_seconds):
+                progress_callback("Audio Processing", percent, f"Compressing audio {percent:.0f}%",
+                                 remaining_seconds)
+        else:
+            on_progress = None
+        
+        # Convert to mono 16kHz (OpenAI recommended) and compress in one ffmpeg pass
+        args = ["-i", input_path, *TRANSCRIPTION_AUDIO_ARGS, "-b:a", bitrate, output_path]
+        returncode = run_ffmpeg_with_progress(args, duration_ms, on_progress)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, [FFMPEG_PATH, *args])
+        
+        if progress_callback:
+            progress_callback("Audio Processing", 100, "Compression complete", 0)
+        
+        return output_path
 
     @staticmethod
     def trim_audio_to_size_limit(input_path: str, target_path: str = "clipped_audio.mp3", 
@@ -148,51 +246,37 @@ class AudioProcessor:
         Returns:
             Path to trimmed audio file
         """
-        # Try more aggressive compression first
-        sound = AudioSegment.from_file(input_path)
-        
-        # For very large files, try progressively more aggressive compression before trimming
-        if get_file_size_mb(input_path) > max_size_mb * 2:
-            # Try mono first
-            sound = sound.set_channels(1)
-            
-            # Try reducing sample rate
-            sound = sound.set_frame_rate(16000)
-            
-            # Try exporting with lower bitrate
-            temp_path = "temp_compressed.mp3"
-            sound.export(temp_path, format="mp3", bitrate="4k")
-            
-            # Check if compression was enough
-            if get_file_size_mb(temp_path) <= max_size_mb:
-                os.rename(temp_path, target_path)
-                return target_path
-            
-            # If still too large, fall back to trimming
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        max_bytes = max_size_mb * 1024 * 1024
+        duration_seconds = AudioProcessor.get_audio_duration_ms(input_path) / 1000
         
-        # Calculate duration limit based on bitrate
-        bitrate_kbps = int(bitrate.replace("k", ""))
-        seconds_limit = int((max_size_mb * 1024 * 1024 * 8) / (bitrate_kbps * 1024))
+        # For very large files, keep the full length at 4k when the bitrate math says it fits
+        if get_file_size_mb(input_path) > max_size_mb * 2 and duration_seconds * 4 * 1024 / 8 <= max_bytes:
+            encode_args = ["-b:a", "4k"]
+        else:
+            # Otherwise trim to the duration that fits at the requested bitrate
+            bitrate_kbps = int(bitrate.replace("k", ""))
+            seconds_limit = int((max_bytes * 8) / (bitrate_kbps * 1024))
+            encode_args = ["-b:a", bitrate, "-t", str(seconds_limit)]
         
-        # Clip the audio
-        clipped = sound[:seconds_limit * 1000]
-        clipped.export(target_path, format="mp3", bitrate=bitrate)
+        # Single encode pass; -fs enforces the size cap regardless of encoder overhead
+        subprocess.run([
+            FFMPEG_PATH, "-y", "-v", "error", "-i", input_path,
+            *TRANSCRIPTION_AUDIO_ARGS, *encode_args,
+            "-fs", str(max_bytes), target_path
+        ], check=True)
         
         return target_path
 
     @staticmethod
     def process_audio_for_duration(input_path: str, output_path: str = "clipped_audio.mp3",
-                                 duration_choice: str = "Full video", bitrate: str = "16k") -> str:
+                                 duration_choice: str = "Full video") -> str:
         """
         Process audio according to selected duration
         
         Args:
-            input_path: Path to input audio file
+            input_path: Path to input audio file (already compressed)
             output_path: Path to save processed audio
             duration_choice: Duration option (e.g., "First 10 minutes")
-            bitrate: Bitrate for compression
             
         Returns:
             Path to processed audio file
@@ -203,15 +287,12 @@ class AudioProcessor:
         # Extract minutes from duration choice
         limit_minutes = int(duration_choice.split()[1])
         
-        sound = AudioSegment.from_file(input_path)
-        clipped = sound[:limit_minutes * 60 * 1000]
-        clipped.export(output_path, format="mp3", bitrate=bitrate)
-        
-        return output_path
+        return AudioProcessor.extract_segment(input_path, output_path, duration_ms=limit_minutes * 60 * 1000)
 
     @staticmethod
     def split_audio_into_segments(audio_path: str, segment_size_minutes: int = 15, 
-                                output_dir: str = "./temp_segments") -> list:
+                                output_dir: str = "./temp_segments",
+                                on_segment: Optional[Callable[[dict], Any]] = None) -> list:
         """
         Split audio into segments for processing
         
@@ -219,34 +300,59 @@ class AudioProcessor:
             audio_path: Path to audio file
             segment_size_minutes: Size of each segment in minutes
             output_dir: Directory to save segments
+            on_segment: Called with each segment as soon as its file is complete
             
         Returns:
             List of segment file paths
         """
         os.makedirs(output_dir, exist_ok=True)
         
-        sound = AudioSegment.from_file(audio_path)
-        total_duration_ms = len(sound)
+        total_duration_ms = AudioProcessor.get_audio_duration_ms(audio_path)
         segment_size_ms = segment_size_minutes * 60 * 1000
         
-        segment_paths = []
+        def run_muxer(codec_args: List[str]) -> list:
+            # Write every segment in one streaming ffmpeg pass with the segment muxer,
+            # which lists each file on stdout once it is closed
+            written = []
+            cmd = [
+                FFMPEG_PATH, "-y", "-v", "error", "-i", audio_path, "-vn",
+                "-f", "segment", "-segment_time", str(segment_size_minutes * 60),
+                "-reset_timestamps", "1", "-segment_list", "pipe:1", "-segment_list_type", "flat",
+                *codec_args, os.path.join(output_dir, "segment_%d.mp3")
+            ]
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+                for line in proc.stdout:
+                    # Every listed file is kept, even past the metadata duration (which
+                    # can be underestimated), with its times taken from its index
+                    name = line.strip()
+                    match = re.fullmatch(r"segment_(\d+)\.mp3", name)
+                    if not match:
+                        continue
+                    segment_num = int(match.group(1))
+                    start_ms = segment_num * segment_size_ms
+                    end_ms = start_ms + segment_size_ms
+                    if start_ms < total_duration_ms < end_ms:
+                        end_ms = total_duration_ms
+                    segment = {
+                        "path": os.path.join(output_dir, name),
+                        "segment_num": segment_num,
+                        "start_ms": start_ms,
+                        "end_ms": end_ms
+                    }
+                    written.append(segment)
+                    if on_segment:
+                        on_segment(segment)
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+            return written
         
-        for i in range(0, total_duration_ms, segment_size_ms):
-            start_ms = i
-            end_ms = min(i + segment_size_ms, total_duration_ms)
-            
-            segment = sound[start_ms:end_ms]
-            segment_path = os.path.join(output_dir, f"segment_{i // segment_size_ms}.mp3")
-            segment.export(segment_path, format="mp3", bitrate="16k")
-            
-            segment_paths.append({
-                "path": segment_path,
-                "segment_num": i // segment_size_ms,
-                "start_ms": start_ms,
-                "end_ms": end_ms
-            })
-        
-        return segment_paths
+        try:
+            # MP3 sources are split by stream copy (no decode or re-encode)
+            return run_muxer(["-c:a", "copy"])
+        except subprocess.CalledProcessError:
+            # The source codec doesn't fit the MP3 segments, so encode them to
+            # transcription-ready audio instead, as extract_segment does
+            return run_muxer([*TRANSCRIPTION_AUDIO_ARGS[1:], "-c:a", "libmp3lame", "-b:a", DEFAULT_BITRATE])
 
     @staticmethod
     def is_long_video(audio_path: str, threshold_minutes: int = 60) -> bool:
@@ -260,6 +366,5 @@ class AudioProcessor:
         Returns:
             Boolean indicating if video is "long"
         """
-        sound = AudioSegment.from_file(audio_path)
-        duration_minutes = len(sound) / (1000 * 60)
+        duration_minutes = AudioProcessor.get_audio_duration_ms(audio_path) / (1000 * 60)
         return duration_minutes > threshold_minutes
\ No newline at end of file
@@ -1,112 +1,157 @@
 import os
-import json
+import hashlib
+import sqlite3
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Union
 from src.config.settings import CACHE_DIR
 
+# Whole-video reads are memoized briefly, so repeated checks for the same video
+# (e.g. on UI reruns) skip the database; shared by every instance on the same
+# database so a write through one invalidates the others' entries
+_MEMO_TTL_SECONDS = 30
+_MEMO_MAX_ENTRIES = 64
+_memo = {}
+_memo_lock = threading.Lock()
+_MISSING = object()
+
+def file_sha256(path: Union[str, Path], block_size: int = 1024 * 1024) -> str:
+    """Hash a file's contents in blocks, without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 class TranscriptionCache:
     """Manages caching of partial transcriptions for long videos"""
     
-    def __init__(self, cache_dir: str = CACHE_DIR):
+    def __init__(self, cache_dir: Union[str, Path] = CACHE_DIR):
         self.cache_dir = cache_dir
-        os.makedirs(cache_dir, exist_ok=True)
+        # CACHE_DIR is already created when settings are imported
+        if Path(cache_dir) != CACHE_DIR:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        # One SQLite file holds every segment; WAL keeps reads concurrent with writes
+        # and each autocommitted statement is crash-safe on its own
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.get_cache_path(), isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints; a commit can be lost on power
+        # failure but never corrupts the database, and a lost segment is just redone
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS segments("
+            "video_id TEXT, segment_num INTEGER, start_ms INTEGER, end_ms INTEGER, "
+            "transcript TEXT, ts TEXT, PRIMARY KEY(video_id, segment_num))"
+        )
+    
+    def get_cache_path(self) -> str:
+        """Get path for the cache database"""
+        return os.path.join(self.cache_dir, "cache.db")
+    
+    def _memo_get(self, name: str, video_id: str) -> Any:
+        """Get a memoized read result, or _MISSING if absent or expired"""
+        with _memo_lock:
+            cached = _memo.get((self.get_cache_path(), name, video_id))
+        if cached and time.monotonic() - cached[0] < _MEMO_TTL_SECONDS:
+            return cached[1]
+        return _MISSING
     
-    def get_cache_path(self, video_id: str, segment_num: Optional[int] = None) -> str:
-        """Get path for cache file"""
-        if segment_num is not None:
-            return os.path.join(self.cache_dir, f"{video_id}_segment_{segment_num}.json")
-        else:
-            return os.path.join(self.cache_dir, f"{video_id}_metadata.json")
+    def _memo_put(self, name: str, video_id: str, value: Any) -> None:
+        """Memoize a read result, evicting the oldest entry when full"""
+        with _memo_lock:
+            if len(_memo) >= _MEMO_MAX_ENTRIES:
+                del _memo[min(_memo, key=lambda k: _memo[k][0])]
+            _memo[(self.get_cache_path(), name, video_id)] = (time.monotonic(), value)
+    
+    def invalidate(self, video_id: str) -> None:
+        """Drop memoized reads for a video"""
+        db_path = self.get_cache_path()
+        with _memo_lock:
+            for key in [k for k in _memo if k[0] == db_path and k[2] == video_id]:
+                del _memo[key]
     
     def save_segment(self, video_id: str, segment_num: int, 
                     start_time: int, end_time: int, transcript: str) -> str:
         """Save a transcribed segment to cache"""
-        cache_file = self.get_cache_path(video_id, segment_num)
-        
-        data = {
-            "segment": segment_num,
-            "start_time": start_time,
-            "end_time": end_time,
-            "transcript": transcript,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        with open(cache_file, 'w') as f:
-            json.dump(data, f)
-        
-        # Update metadata
-        self._update_metadata(video_id, segment_num)
-        
-        return cache_file
+        return self.save_segments(video_id, [
+            {"segment": segment_num, "start_time": start_time, "end_time": end_time, "transcript": transcript}
+        ])
     
-    def _update_metadata(self, video_id: str, latest_segment: int) -> None:
-        """Update metadata with latest processed segment info"""
-        metadata_file = self.get_cache_path(video_id)
+    def save_segments(self, video_id: str, segments: List[Dict[str, Any]]) -> str:
+        """Save several transcribed segments in one transaction (keys as in get_cached_segments)"""
+        timestamp = datetime.now().isoformat()
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?)",
+                    [(video_id, s["segment"], s["start_time"], s["end_time"], s["transcript"], timestamp)
+                     for s in segments]
+                )
+        self.invalidate(video_id)
         
-        try:
-            if os.path.exists(metadata_file):
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
-            else:
-                metadata = {"video_id": video_id, "segments": [], "last_updated": None}
-            
-            # Update segment info
-            if latest_segment not in metadata["segments"]:
-                metadata["segments"].append(latest_segment)
-                metadata["segments"].sort()
-            
-            metadata["last_updated"] = datetime.now().isoformat()
-            metadata["segments_completed"] = len(metadata["segments"])
-            
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f)
-                
-        except Exception as e:
-            print(f"Error updating cache metadata: {e}")
+        return self.get_cache_path()
     
     def get_cached_segments(self, video_id: str) -> List[Dict[str, Any]]:
         """Get all cached segments for a video"""
-        metadata_file = self.get_cache_path(video_id)
-        
-        if not os.path.exists(metadata_file):
-            return []
+        segments = self._memo_get("segments", video_id)
+        if segments is not _MISSING:
+            return segments
         
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT segment_num, start_ms, end_ms, transcript, ts FROM segments "
+                "WHERE video_id = ? ORDER BY segment_num",
+                (video_id,)
+            ).fetchall()
         
-        segments = []
-        for segment_num in metadata.get("segments", []):
-            segment_file = self.get_cache_path(video_id, segment_num)
-            if os.path.exists(segment_file):
-                with open(segment_file, 'r') as f:
-                    segments.append(json.load(f))
-        
-        # Sort by segment number
-        segments.sort(key=lambda x: x["segment"])
+        segments = [
+            {"segment": segment, "start_time": start_time, "end_time": end_time,
+             "transcript": transcript, "timestamp": timestamp}
+            for segment, start_time, end_time, transcript, timestamp in rows
+        ]
+        self._memo_put("segments", video_id, segments)
         return segments
     
+    def get_cached_transcript(self, video_id: str, segment_num: int) -> Optional[str]:
+        """Get one cached segment's transcript by primary key (None if not cached)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT transcript FROM segments WHERE video_id = ? AND segment_num = ?",
+                (video_id, segment_num)
+            ).fetchone()
+        
+        return row[0] if row else None
+    
     def combine_transcripts(self, video_id: str) -> Optional[str]:
         """Combine all cached segments into a full transcript"""
-        segments = self.get_cached_segments(video_id)
+        combined = self._memo_get("combined", video_id)
+        if combined is not _MISSING:
+            return combined
         
-        if not segments:
-            return None
+        # SQLite joins the transcripts in segment order without a Python-side copy
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT group_concat(transcript, ' ') FROM "
+                "(SELECT transcript FROM segments WHERE video_id = ? ORDER BY segment_num)",
+                (video_id,)
+            ).fetchone()
         
-        # Combine all transcripts in order
-        full_transcript = " ".join([s["transcript"] for s in segments])
-        return full_transcript
+        combined = row[0] if row else None
+        self._memo_put("combined", video_id, combined)
+        return combined
     
     def is_fully_cached(self, video_id: str, total_segments: int) -> bool:
         """Check if all segments are cached"""
-        metadata_file = self.get_cache_path(video_id)
-        
-        if not os.path.exists(metadata_file):
-            return False
-        
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-        
-        cached_segments = set(metadata.get("segments", []))
-        all_segments = set(range(total_segments))
+        with self._lock:
+            (count,) = self.conn.execute(
+                "SELECT COUNT(*) FROM segments WHERE video_id = ? AND segment_num BETWEEN 0 AND ?",
+                (video_id, total_segments - 1)
+            ).fetchone()
         
-        return cached_segments == all_segments
\ No newline at end of file
+        return count == total_segments
@@ -1,27 +1,74 @@
 import os
+import copy
+import time
+import atexit
 import hashlib
-import yt_dlp
+import threading
+from functools import lru_cache
 from typing import Optional, Callable, Any
-from src.config.settings import FFMPEG_PATH
+from src.config.settings import FFMPEG_PATH, YOUTUBE_VIDEO_ID_RE
+from src.utils.audio_processor import AudioProcessor, TRANSCRIPTION_AUDIO_ARGS, run_ffmpeg_with_progress
+
+# yt-dlp options shared by every download; mutable per-call options (postprocessors,
+# progress hooks) are added to a copy so this template is never modified
+_BASE_YDL_OPTS = {
+    'ffmpeg-location': os.path.dirname(FFMPEG_PATH),
+    'quiet': False,  # Set to False to see detailed logs
+    'retries': 10,  # Add retry attempts
+    'fragment_retries': 10,
+    'skip_unavailable_fragments': True,
+    # Fetch DASH/HLS fragments in parallel and large HTTP streams in ranged chunks,
+    # so downloads aren't capped at the per-connection speed
+    'concurrent_fragment_downloads': 8,
+    'http_chunk_size': 10 * 1024 * 1024,
+}
+
+_info_ydl_lock = threading.Lock()
+
+# Unprocessed yt-dlp extraction results by video ID, so retries and Streamlit reruns
+# skip the round trip to YouTube; stream URLs expire, so entries do too
+_INFO_CACHE_TTL_SECONDS = 3600
+_raw_info_cache = {}
+
+@lru_cache(maxsize=1)
+def _get_info_ydl():
+    """
+    Get the shared yt-dlp instance used for metadata lookups
+    
+    Building a YoutubeDL registers every extractor, so the instance is created
+    once and reused; callers must hold _info_ydl_lock while using it.
+    """
+    import yt_dlp
+    ydl = yt_dlp.YoutubeDL({'quiet': True, 'format': 'bestaudio/best'})
+    atexit.register(ydl.close)
+    return ydl
 
 class VideoDownloader:
     """Handles downloading of videos from YouTube"""
     
     @staticmethod
+    @lru_cache(maxsize=256)
     def get_video_id(url: str) -> str:
         """
         Get a unique identifier for a YouTube video URL
         
+        The canonical 11-character YouTube ID is used when it can be parsed, so
+        the same video shares caches regardless of URL form or tracking params.
+        
         Args:
             url: YouTube URL
             
         Returns:
-            Hash string that uniquely identifies the video
+            String that uniquely identifies the video
         """
-        return hashlib.md5(url.encode()).hexdigest()
+        match = YOUTUBE_VIDEO_ID_RE.search(url)
+        if match:
+            return match.group(1)
+        return hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
     
     def download_audio(self, youtube_url: str, output_path: str = "audio",
-                     progress_callback: Optional[Callable[[str, float, str, Optional[float]], Any]] = None) -> str:
+                     progress_callback: Optional[Callable[[str, float, str, Optional[float]], Any]] = None,
+                     compress: bool = False) -> str:
         """
         Download audio from a YouTube video with enhanced error handling
         
@@ -29,6 +76,8 @@ class VideoDownloader:
             youtube_url: YouTube video URL
             output_path: Base path for the output file
             progress_callback: Function to report progress
+            compress: Stream straight to transcription-ready audio (mono, 16kHz,
+                bitrate chosen from the video length) instead of 192k MP3
             
         Returns:
             Path to downloaded audio file
@@ -38,59 +87,68 @@ class VideoDownloader:
             FileNotFoundError: If downloaded file is not found
         """
         ydl_opts = {
+            **_BASE_YDL_OPTS,
             'format': 'bestaudio/best',
             'outtmpl': f'{output_path}.%(ext)s',
-            'ffmpeg-location': os.path.dirname(FFMPEG_PATH),
-            'quiet': False,  # Set to False to see detailed logs
-            'retries': 10,  # Add retry attempts
-            'fragment_retries': 10,
-            'skip_unavailable_fragments': True,
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
                 'preferredquality': '192',
             }],
         }
+        
+        final_mp3 = f"{output_path}.mp3"
+        streamed = False
 
         if progress_callback:
             progress_callback("Download", 10, "Initializing download", None)
+
+        if compress:
+            info = self._extract_audio_info(youtube_url)
+            bitrate = AudioProcessor.select_bitrate((info.get('duration') or 0) / 60)
+            
+            # Encode while the audio is still arriving, in a single ffmpeg process
+            if info.get('url'):
+                streamed = self._stream_audio(info, final_mp3, bitrate, progress_callback)
             
-            # Add progress hooks
+            # Otherwise encode the final audio in yt-dlp's extraction pass, so there
+            # is no 192k intermediate to decode and re-encode afterwards
+            ydl_opts['postprocessors'][0]['preferredquality'] = bitrate.rstrip('k')
+            ydl_opts['postprocessor_args'] = {'extractaudio': list(TRANSCRIPTION_AUDIO_ARGS)}
+
+        if progress_callback:
+            # Add progress hooks; they replace yt-dlp's own console progress output
             ydl_opts['progress_hooks'] = [
                 lambda d: self._progress_hook(d, progress_callback)
             ]
+            ydl_opts['noprogress'] = True
 
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([youtube_url])
-        except Exception as e:
-            # If standard method fails, try alternative formats
-            if progress_callback:
-                progress_callback("Download", 30, "Trying alternative format", None)
-                
-            # Try with a different format option
-            ydl_opts['format'] = 'worstaudio/worst'  # Try with lowest quality to ensure it downloads
+        if not streamed:
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([youtube_url])
-            except Exception as inner_e:
-                raise RuntimeError(f"❌ Failed to download audio. Reason: {inner_e}")
+                self._run_download(ydl_opts, youtube_url)
+            except Exception as e:
+                # If standard method fails, try alternative formats
+                if progress_callback:
+                    progress_callback("Download", 30, "Trying alternative format", None)
+                    
+                # Try with a different format option
+                ydl_opts['format'] = 'worstaudio/worst'  # Try with lowest quality to ensure it downloads
+                try:
+                    self._run_download(ydl_opts, youtube_url)
+                except Exception as inner_e:
+                    raise RuntimeError(f"❌ Failed to download audio. Reason: {inner_e}")
 
-        final_mp3 = f"{output_path}.mp3"
         if not os.path.exists(final_mp3):
             raise FileNotFoundError("❌ Audio file not found after download. Check if video is private or restricted.")
 
-        # Verify the file is valid
-        try:
-            from pydub import AudioSegment
-            _ = AudioSegment.from_file(final_mp3)
+        # Verify the file is valid by probing its duration (no full decode)
+        if AudioProcessor.get_audio_duration_ms(final_mp3) <= 0:
+            raise RuntimeError("❌ Downloaded audio file appears to be corrupted. Reason: no readable audio duration")
+        
+        if progress_callback:
+            progress_callback("Download", 100, "Download complete", 0)
             
-            if progress_callback:
-                progress_callback("Download", 100, "Download complete", 0)
-                
-            return final_mp3
-        except Exception as e:
-            raise RuntimeError(f"❌ Downloaded audio file appears to be corrupted. Reason: {e}")
+        return final_mp3
     
     def download_video(self, youtube_url: str, output_path: str = None,
                     max_height: int = 720,
@@ -120,13 +178,9 @@ class VideoDownloader:
         format_str = f'bestvideo[height<={max_height}]+bestaudio/best[height<={max_height}]/best'
         
         ydl_opts = {
+            **_BASE_YDL_OPTS,
             'format': format_str,
             'outtmpl': f'{output_path}.%(ext)s',
-            'ffmpeg-location': os.path.dirname(FFMPEG_PATH),
-            'quiet': False,
-            'retries': 10,
-            'fragment_retries': 10,
-            'skip_unavailable_fragments': True,
             # Merge into mp4 container
             'postprocessors': [{
                 'key': 'FFmpegVideoConvertor',
@@ -139,14 +193,14 @@ class VideoDownloader:
         if progress_callback:
             progress_callback("Video Download", 10, "Initializing video download", None)
             
-            # Add progress hooks
+            # Add progress hooks; they replace yt-dlp's own console progress output
             ydl_opts['progress_hooks'] = [
                 lambda d: self._video_progress_hook(d, progress_callback)
             ]
+            ydl_opts['noprogress'] = True
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([youtube_url])
+            self._run_download(ydl_opts, youtube_url)
         except Exception as e:
             # If standard method fails, try alternative formats
             if progress_callback:
@@ -155,14 +209,12 @@ class VideoDownloader:
             # Try with a different format option (lower quality)
             ydl_opts['format'] = f'bestvideo[height<=480]+bestaudio/best[height<=480]/best'
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([youtube_url])
+                self._run_download(ydl_opts, youtube_url)
             except Exception as inner_e:
                 # Try one last time with even simpler options
                 try:
                     ydl_opts['format'] = 'worst'
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        ydl.download([youtube_url])
+                    self._run_download(ydl_opts, youtube_url)
                 except Exception as final_e:
                     raise RuntimeError(f"❌ Failed to download video. Reason: {final_e}")
 
@@ -176,6 +228,117 @@ class VideoDownloader:
         
         raise FileNotFoundError("❌ Video file not found after download. Check if video is private or restricted.")
             
+    @staticmethod
+    def _extract_raw_info(youtube_url: str) -> Optional[dict]:
+        """
+        Extract (or reuse) the video's unprocessed yt-dlp info, before any format selection
+        
+        Args:
+            youtube_url: YouTube video URL
+            
+        Returns:
+            Raw info dict, or None if extraction fails
+        """
+        video_id = VideoDownloader.get_video_id(youtube_url)
+        now = time.monotonic()
+        cached = _raw_info_cache.get(video_id)
+        if cached and now - cached[0] < _INFO_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        try:
+            with _info_ydl_lock:
+                raw_info = _get_info_ydl().extract_info(youtube_url, download=False, process=False)
+        except Exception:
+            return None
+        
+        # Drop expired entries while adding the new one
+        for key in [k for k, (ts, _) in _raw_info_cache.items() if now - ts >= _INFO_CACHE_TTL_SECONDS]:
+            del _raw_info_cache[key]
+        _raw_info_cache[video_id] = (now, raw_info)
+        return raw_info
+    
+    @staticmethod
+    def _run_download(ydl_opts: dict, youtube_url: str) -> None:
+        """
+        Download with yt-dlp, reusing the cached extraction so only format selection reruns
+        
+        Args:
+            ydl_opts: yt-dlp options for this download
+            youtube_url: YouTube video URL
+        """
+        # yt-dlp loads all of its extractors on import, so only pay for it when downloading
+        import yt_dlp
+        raw_info = VideoDownloader._extract_raw_info(youtube_url)
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if raw_info:
+                # Processing mutates the info dict, so work on a copy
+                ydl.process_ie_result(copy.deepcopy(raw_info), download=True)
+            else:
+                ydl.download([youtube_url])
+    
+    @staticmethod
+    def _extract_audio_info(youtube_url: str) -> dict:
+        """
+        Resolve the video's length and best audio stream without downloading
+        
+        Args:
+            youtube_url: YouTube video URL
+            
+        Returns:
+            yt-dlp info dict for the selected audio format (empty if extraction fails)
+        """
+        raw_info = VideoDownloader._extract_raw_info(youtube_url)
+        if not raw_info:
+            return {}
+        try:
+            with _info_ydl_lock:
+                return _get_info_ydl().process_ie_result(copy.deepcopy(raw_info), download=False) or {}
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def _stream_audio(info: dict, output_file: str, bitrate: str,
+                      progress_callback: Optional[Callable] = None) -> bool:
+        """
+        Download and compress the audio stream in one ffmpeg process
+        
+        ffmpeg reads the stream over HTTP and encodes as it goes, so the download
+        and the encode overlap instead of running back to back.
+        
+        Args:
+            info: yt-dlp info dict with the selected format's URL
+            output_file: Path to save the compressed audio
+            bitrate: Target bitrate
+            progress_callback: Function to report progress
+            
+        Returns:
+            True if the audio was written, False to fall back to yt-dlp's downloader
+        """
+        args = []
+        headers = info.get('http_headers') or {}
+        if headers:
+            args += ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+        args += ["-i", info['url'], *TRANSCRIPTION_AUDIO_ARGS, "-b:a", bitrate, output_file]
+        
+        on_progress = None
+        if progress_callback:
+            def on_progress(percent, remaining_seconds):
+                progress_callback("Download", 10 + percent * 0.8,
+                                f"Downloading and compressing: {percent:.0f}%", remaining_seconds)
+        
+        try:
+            returncode = run_ffmpeg_with_progress(args, int((info.get('duration') or 0) * 1000), on_progress)
+        except OSError as e:
+            print(f"Error streaming audio: {e}")
+            return False
+        
+        if returncode != 0:
+            print(f"Streaming audio failed (ffmpeg exit {returncode}), falling back to yt-dlp")
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            return False
+        return True
+    
     def _progress_hook(self, d: dict, progress_callback: Callable) -> None:
         """
         Process progress information from yt-dlp for audio
@@ -1,14 +1,33 @@
 import os
+import re
 import json
+import hashlib
+import time
+import asyncio
 import openai
-from langdetect import detect, LangDetectException
+from functools import lru_cache
+from openai import AsyncOpenAI
+from langdetect import detect, LangDetectException, DetectorFactory, detector_factory
 import iso639
 from typing import Dict, Any, List, Optional, Tuple
-from src.config.settings import OPENAI_API_KEY
+from src.config.settings import (
+    OPENAI_API_KEY,
+    TRANSLATION_MAX_CONCURRENCY,
+    TRANSLATION_BATCH_API_MIN_SEGMENTS,
+    TRANSLATION_JSON_GROUP_TOKENS
+)
+from src.langchain_pipeline.llm import count_tokens
+
+# Paragraph and sentence boundaries used to split long texts for translation
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\n")
+_SENTENCE_END_RE = re.compile(r"\. ")
 
 # Set OpenAI API key
 openai.api_key = OPENAI_API_KEY
 
+# Make language detection deterministic (langdetect samples randomly by default)
+DetectorFactory.seed = 0
+
 class LanguageProcessor:
     """Handles language detection and translation for multilingual support"""
     
@@ -37,6 +56,33 @@ class LanguageProcessor:
         'th': 'Thai'
     }
     
+    # Supported languages sorted by name, built once
+    SUPPORTED_LANGUAGES = tuple(sorted(
+        ({"code": code, "name": name} for code, name in LANGUAGE_MAP.items()),
+        key=lambda language: language["name"]
+    ))
+    
+    # Translated texts keyed by (target language, sha1 of text), oldest evicted first
+    TRANSLATION_CACHE_SIZE = 10000
+    _translation_cache: Dict[Tuple[str, str], str] = {}
+    
+    @staticmethod
+    def _init_detector() -> None:
+        """Load langdetect profiles for the supported languages only, instead of all 55"""
+        if detector_factory._factory is not None:
+            return
+        
+        profiles = []
+        for filename in sorted(os.listdir(detector_factory.PROFILES_DIRECTORY)):
+            # Profiles are named by language code, with regional variants such as zh-cn
+            if filename.split('-')[0] in LanguageProcessor.LANGUAGE_MAP:
+                with open(os.path.join(detector_factory.PROFILES_DIRECTORY, filename), encoding='utf-8') as f:
+                    profiles.append(f.read())
+        
+        factory = DetectorFactory()
+        factory.load_json_profile(profiles)
+        detector_factory._factory = factory
+    
     @staticmethod
     def detect_language(text: str) -> Tuple[str, str]:
         """
@@ -48,9 +94,15 @@ class LanguageProcessor:
         Returns:
             Tuple of (language code, language name)
         """
+        # Get a sample of the text (first 1000 chars); repeated texts hit the cache
+        return LanguageProcessor._detect_sample(text[:1000])
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _detect_sample(sample: str) -> Tuple[str, str]:
+        """Detect the language of a text sample (cached per sample)"""
         try:
-            # Get a sample of the text (first 1000 chars)
-            sample = text[:1000]
+            LanguageProcessor._init_detector()
             
             # Detect language code
             lang_code = detect(sample)
@@ -67,6 +119,21 @@ class LanguageProcessor:
         except LangDetectException:
             return 'unknown', 'Unknown'
     
+    @staticmethod
+    async def adetect_language(text: str) -> Tuple[str, str]:
+        """
+        Async variant of detect_language, run in a worker thread so it can
+        overlap with network-bound work such as answering a question
+        
+        Args:
+            text: Text to analyze
+            
+        Returns:
+            Tuple of (language code, language name)
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, LanguageProcessor.detect_language, text)
+    
     @staticmethod
     def translate_text(text: str, target_language: str = 'en') -> str:
         """
@@ -85,15 +152,12 @@ class LanguageProcessor:
             target_language
         )
         
-        # For very long texts, split and translate in chunks
+        # For very long texts, split and translate the chunks concurrently
         if len(text) > 4000:
             chunks = LanguageProcessor._split_text(text)
-            translated_chunks = []
-            
-            for chunk in chunks:
-                # Translate each chunk
-                translated_chunk = LanguageProcessor._translate_chunk(chunk, target_lang_name)
-                translated_chunks.append(translated_chunk)
+            translated_chunks = asyncio.run(
+                LanguageProcessor._atranslate_chunks(chunks, target_lang_name)
+            )
             
             return " ".join(translated_chunks)
         else:
@@ -114,13 +178,7 @@ class LanguageProcessor:
         """
         try:
             response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": f"You are a professional translator. Translate the following text to {target_language}. Preserve formatting, line breaks, and special characters as much as possible. Translate only the content, not any metadata or markers."},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.3,
-                max_tokens=4000
+                **LanguageProcessor._translation_request(text, target_language)
             )
             
             return response.choices[0].message.content
@@ -128,6 +186,114 @@ class LanguageProcessor:
             print(f"Translation error: {e}")
             return text  # Return original text if translation fails
     
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _translation_system_message(target_language: str) -> Dict[str, str]:
+        """Build the translator system message once per target language (treat as read-only)"""
+        return {"role": "system", "content": f"You are a professional translator. Translate the following text to {target_language}. Preserve formatting, line breaks, and special characters as much as possible. Translate only the content, not any metadata or markers."}
+    
+    @staticmethod
+    def _translation_request(text: str, target_language: str) -> Dict[str, Any]:
+        """Build the chat completion parameters for translating text"""
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                LanguageProcessor._translation_system_message(target_language),
+                {"role": "user", "content": text}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 4000
+        }
+    
+    @staticmethod
+    async def _atranslate_chunks(chunks: List[str], target_language: str) -> List[str]:
+        """
+        Translate chunks concurrently; translation is network-bound
+        
+        Args:
+            chunks: Text chunks to translate
+            target_language: Target language name
+            
+        Returns:
+            Translated chunks in input order (originals for chunks that fail)
+        """
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        semaphore = asyncio.Semaphore(TRANSLATION_MAX_CONCURRENCY)
+        
+        async def translate(chunk: str) -> str:
+            async with semaphore:
+                try:
+                    response = await client.chat.completions.create(
+                        **LanguageProcessor._translation_request(chunk, target_language)
+                    )
+                    return response.choices[0].message.content
+                except Exception as e:
+                    print(f"Translation error: {e}")
+                    return chunk  # Return original text if translation fails
+        
+        try:
+            return await asyncio.gather(*[translate(chunk) for chunk in chunks])
+        finally:
+            await client.close()
+    
+    @staticmethod
+    def translate_text_batch_api(texts: List[str], target_language: str = 'en',
+                                 poll_interval: float = 30.0) -> List[str]:
+        """
+        Translate many texts as one OpenAI Batch API job (half the cost, no rate limits)
+        
+        The job can take up to 24 hours, so this is meant for offline work on
+        large transcripts rather than interactive requests.
+        
+        Args:
+            texts: Texts to translate
+            target_language: Target language code (ISO 639-1)
+            poll_interval: Seconds between job status checks
+            
+        Returns:
+            Translated texts in input order (originals for texts that fail)
+        """
+        target_lang_name = LanguageProcessor.LANGUAGE_MAP.get(target_language, target_language)
+        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        translations = list(texts)
+        
+        # One request per text; custom_id carries the index back with the result
+        requests = "\n".join(
+            json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": LanguageProcessor._translation_request(text, target_lang_name)
+            })
+            for i, text in enumerate(texts)
+        )
+        
+        try:
+            batch_file = client.files.create(file=("translations.jsonl", requests.encode()), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(poll_interval)
+                batch = client.batches.retrieve(batch.id)
+            
+            if batch.status != "completed" or not batch.output_file_id:
+                print(f"Translation batch {batch.id} ended with status {batch.status}")
+                return translations
+            
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    translations[int(result["custom_id"])] = response["body"]["choices"][0]["message"]["content"]
+        except Exception as e:
+            print(f"Batch translation error: {e}")
+        
+        return translations
+    
     @staticmethod
     def _split_text(text: str, max_chunk_size: int = 4000) -> List[str]:
         """
@@ -140,45 +306,45 @@ class LanguageProcessor:
         Returns:
             List of text chunks
         """
-        # Try to split on paragraph breaks first
-        paragraphs = text.split('\n\n')
+        # Paragraph spans as offsets into the original text
+        spans = []
+        para_start = 0
+        for match in _PARAGRAPH_BREAK_RE.finditer(text):
+            spans.append((para_start, match.start()))
+            para_start = match.end()
+        spans.append((para_start, len(text)))
         
         chunks = []
-        current_chunk = ""
+        chunk_start = chunk_end = None
         
-        for para in paragraphs:
+        for para_start, para_end in spans:
             # If adding this paragraph would exceed chunk size, start a new chunk
-            if len(current_chunk) + len(para) > max_chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk)
+            if chunk_start is not None and para_end - chunk_start > max_chunk_size:
+                if chunk_end > chunk_start:
+                    chunks.append(text[chunk_start:chunk_end])
+                chunk_start = None
+            
+            if chunk_start is None:
+                chunk_start = para_start
                 
-                # If paragraph itself is too long, split by sentences
-                if len(para) > max_chunk_size:
-                    sentences = para.split('. ')
-                    sentence_chunk = ""
-                    
-                    for sentence in sentences:
-                        if len(sentence_chunk) + len(sentence) + 2 > max_chunk_size:
-                            chunks.append(sentence_chunk)
-                            sentence_chunk = sentence + ". "
-                        else:
-                            sentence_chunk += sentence + ". "
-                    
-                    if sentence_chunk:
-                        current_chunk = sentence_chunk
-                    else:
-                        current_chunk = ""
-                else:
-                    current_chunk = para
-            else:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
+                # If paragraph itself is too long, emit runs of whole sentences
+                # and keep the remainder open for the following paragraphs
+                if para_end - para_start > max_chunk_size:
+                    last_end = para_start
+                    for match in _SENTENCE_END_RE.finditer(text, para_start, para_end):
+                        if match.end() - chunk_start > max_chunk_size and last_end > chunk_start:
+                            chunks.append(text[chunk_start:last_end])
+                            chunk_start = last_end
+                        last_end = match.end()
+                    if para_end - chunk_start > max_chunk_size and last_end > chunk_start:
+                        chunks.append(text[chunk_start:last_end])
+                        chunk_start = last_end
+            
+            chunk_end = para_end
         
         # Add the last chunk if there's anything left
-        if current_chunk:
-            chunks.append(current_chunk)
+        if chunk_start is not None and chunk_end > chunk_start:
+            chunks.append(text[chunk_start:chunk_end])
         
         return chunks
     
@@ -190,55 +356,155 @@ class LanguageProcessor:
         Returns:
             List of language dictionaries with code and name
         """
-        languages = []
-        for code, name in LanguageProcessor.LANGUAGE_MAP.items():
-            languages.append({
-                "code": code,
-                "name": name
-            })
-        
-        # Sort by language name
-        languages.sort(key=lambda x: x["name"])
-        
-        return languages
+        # Copy the entries so callers can't modify the shared list
+        return [dict(language) for language in LanguageProcessor.SUPPORTED_LANGUAGES]
+    
+    @staticmethod
+    def _translation_key(text: str, target_language: str) -> Tuple[str, str]:
+        """Content-addressed cache key for a translation"""
+        return target_language, hashlib.sha1(text.encode()).hexdigest()
     
     @staticmethod
-    def translate_transcript_segments(segments: List[Dict[str, Any]], target_language: str) -> List[Dict[str, Any]]:
+    def _remember_translation(text: str, target_language: str, translation: str) -> None:
+        """Cache a translation, evicting the oldest entry when the cache is full"""
+        # Failed translations come back unchanged; don't cache those
+        if translation == text:
+            return
+        cache = LanguageProcessor._translation_cache
+        if len(cache) >= LanguageProcessor.TRANSLATION_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        cache[LanguageProcessor._translation_key(text, target_language)] = translation
+    
+    @staticmethod
+    def translate_transcript_segments(segments: List[Dict[str, Any]], target_language: str,
+                                      use_batch_api: bool = False) -> List[Dict[str, Any]]:
         """
         Translate transcript segments to target language
         
         Args:
             segments: List of transcript segments with text
             target_language: Target language code
+            use_batch_api: Send large transcripts through the Batch API, which is
+                cheaper but can block for hours (up to 24h) until the job completes
             
         Returns:
             List of translated transcript segments
         """
+        target_lang_name = LanguageProcessor.LANGUAGE_MAP.get(target_language, target_language)
+        cache = LanguageProcessor._translation_cache
+        
+        # Transcripts repeat phrases (intros, outros, filler), so only send each
+        # distinct text that hasn't been translated before
+        translations = {}
+        to_translate = []
+        for text in dict.fromkeys(segment["text"] for segment in segments):
+            key = LanguageProcessor._translation_key(text, target_lang_name)
+            if key in cache:
+                translations[text] = cache[key]
+            else:
+                to_translate.append(text)
+        
+        if use_batch_api and len(to_translate) > TRANSLATION_BATCH_API_MIN_SEGMENTS:
+            # Opted-in large transcripts go through the Batch API, one request per text
+            translated = LanguageProcessor.translate_text_batch_api(to_translate, target_language)
+        elif to_translate:
+            translated = LanguageProcessor._translate_texts_json(to_translate, target_lang_name)
+        else:
+            translated = []
+        
+        for text, translation in zip(to_translate, translated):
+            translations[text] = translation
+            LanguageProcessor._remember_translation(text, target_lang_name, translation)
+        
         translated_segments = []
+        for segment in segments:
+            translated_segment = segment.copy()
+            translated_segment["text"] = translations[segment["text"]]
+            translated_segments.append(translated_segment)
+        
+        return translated_segments
+    
+    @staticmethod
+    def _translate_texts_json(texts: List[str], target_language: str) -> List[str]:
+        """
+        Translate texts as indexed JSON arrays, a token-budgeted group per request
+        
+        Args:
+            texts: Texts to translate
+            target_language: Target language name
+            
+        Returns:
+            Translated texts in input order (originals for texts that fail)
+        """
+        return asyncio.run(LanguageProcessor._atranslate_texts_json(texts, target_language))
+    
+    @staticmethod
+    async def _atranslate_texts_json(texts: List[str], target_language: str) -> List[str]:
+        """
+        Translate token-budgeted groups of texts concurrently as indexed JSON arrays
+        
+        Args:
+            texts: Texts to translate
+            target_language: Target language name
+            
+        Returns:
+            Translated texts in input order (originals for texts that fail)
+        """
+        # Send the texts as numbered JSON arrays and ask for the same shape back,
+        # so translations are matched by index instead of by splitting on a marker.
+        # Each group is kept small enough that its reply fits in max_tokens.
+        groups = []
+        group_tokens = 0
+        for i, text in enumerate(texts):
+            item = {"i": i, "t": text}
+            tokens = count_tokens(json.dumps(item, ensure_ascii=False), "gpt-3.5-turbo")
+            if not groups or group_tokens + tokens > TRANSLATION_JSON_GROUP_TOKENS:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(item)
+            group_tokens += tokens
         
-        # Extract all texts to translate in batch
-        all_texts = [segment["text"] for segment in segments]
-        combined_text = "\n---SEGMENT BREAK---\n".join(all_texts)
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        semaphore = asyncio.Semaphore(TRANSLATION_MAX_CONCURRENCY)
+        translated_texts = {}
         
-        # Translate all at once
-        translated_combined = LanguageProcessor.translate_text(combined_text, target_language)
+        async def translate_group(payload: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                try:
+                    response = await client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        response_format={"type": "json_object"},
+                        messages=[
+                            {"role": "system", "content": f"You are a professional translator. Translate the 't' of each item in the JSON array to {target_language}. Respond with a JSON object of the form {{\"items\": [{{\"i\": ..., \"t\": ...}}]}}, keeping every 'i' unchanged."},
+                            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+                        ],
+                        temperature=0.3,
+                        max_tokens=4000
+                    )
+                    items = json.loads(response.choices[0].message.content).get("items", [])
+                except Exception as e:
+                    print(f"Translation error: {e}")
+                    return
+            
+            # Only accept indices that belong to this group
+            expected = {item["i"] for item in payload}
+            for item in items:
+                try:
+                    i = int(item["i"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if i in expected and isinstance(item.get("t"), str):
+                    translated_texts[i] = item["t"]
         
-        # Split back into segments
-        translated_texts = translated_combined.split("\n---SEGMENT BREAK---\n")
+        try:
+            await asyncio.gather(*[translate_group(group) for group in groups])
+        finally:
+            await client.close()
         
-        # Ensure we have the right number of translations
-        if len(translated_texts) != len(segments):
-            # Fallback: translate one by one
-            for segment in segments:
-                translated_text = LanguageProcessor.translate_text(segment["text"], target_language)
-                translated_segment = segment.copy()
-                translated_segment["text"] = translated_text
-                translated_segments.append(translated_segment)
-        else:
-            # Use batch translations
-            for i, segment in enumerate(segments):
-                translated_segment = segment.copy()
-                translated_segment["text"] = translated_texts[i]
-                translated_segments.append(translated_segment)
+        # Translate only the texts missing from their group's response, concurrently
+        missing = [i for i in range(len(texts)) if i not in translated_texts]
+        if missing:
+            retranslated = await LanguageProcessor._atranslate_chunks([texts[i] for i in missing], target_language)
+            translated_texts.update(zip(missing, retranslated))
         
-        return translated_segments
\ No newline at end of file
+        return [translated_texts[i] for i in range(len(texts))]
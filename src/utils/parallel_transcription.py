@@ -1,48 +1,101 @@
 import asyncio
-import aiohttp
+import atexit
+import difflib
+import httpx
 import os
+import queue
+import re
+import tempfile
+import threading
 import time
-from pydub import AudioSegment
 import openai
-from src.config.settings import OPENAI_API_KEY
+from openai import AsyncOpenAI
+from pathlib import Path
+from src.config.settings import OPENAI_API_KEY, CACHE_DIR, TRANSCRIPTION_MAX_RPM, TRANSCRIPTION_OVERLAP_MS
 from src.utils.cache_manager import TranscriptionCache
+from src.utils.audio_processor import AudioProcessor
+from src.langchain_pipeline.llm import RateLimiter
+
+# One request budget shared by the parallel and sequential transcription paths,
+# so concurrent chunks spread out instead of bursting into 429s (Whisper is
+# limited on requests only, so no tokens are counted)
+transcription_rate_limiter = RateLimiter(TRANSCRIPTION_MAX_RPM, max_tpm=0)
+
+# Longest run of words, at the end of one chunk and the start of the next, that
+# can be the overlap between them
+_STITCH_WINDOW_WORDS = 30
+_WORD_CHARS_RE = re.compile(r"[^\w']+")
+
+def stitch_transcripts(previous: str, current: str) -> str:
+    """
+    Drop the start of a chunk's transcript that repeats the end of the previous one
+    
+    Args:
+        previous: Transcript of the preceding chunk
+        current: Transcript of the chunk, whose audio overlaps the preceding one
+        
+    Returns:
+        The current transcript without the overlapping words
+    """
+    words = current.split()
+    # Compare words without case or punctuation, since Whisper may render the
+    # overlap slightly differently on either side of the boundary
+    tail = [_WORD_CHARS_RE.sub("", w.lower()) for w in previous.split()[-_STITCH_WINDOW_WORDS:]]
+    head = [_WORD_CHARS_RE.sub("", w.lower()) for w in words[:_STITCH_WINDOW_WORDS]]
+    match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(
+        0, len(tail), 0, len(head)
+    )
+    
+    # Only a run of two or more words that closes out the previous chunk, and starts
+    # this one after at most a couple of garbled words, is treated as the overlap
+    if match.size < 2 or match.a + match.size != len(tail) or match.b > 2:
+        return current
+    return " ".join(words[match.b + match.size:])
 
 class ParallelTranscriber:
-    def __init__(self, cache_dir="./cache"):
+    def __init__(self, cache_dir=CACHE_DIR):
         self.cache = TranscriptionCache(cache_dir)
         self.api_key = OPENAI_API_KEY
+        self._client = None
+    
+    def _get_client(self) -> AsyncOpenAI:
+        """Get the shared API client, so pooled connections are reused across videos"""
+        if self._client is None:
+            # The SDK retries 429s and 5xx with exponential backoff, honouring Retry-After
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                max_retries=5,
+                timeout=httpx.Timeout(300.0, connect=10.0)
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close the shared API client"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
         
-    async def transcribe_chunk(self, session, chunk_path, video_id, chunk_id, start_ms, end_ms):
-        """Transcribe a single audio chunk using OpenAI API"""
-        # Check cache first
-        cached_segments = self.cache.get_cached_segments(video_id)
-        for segment in cached_segments:
-            if segment["segment"] == chunk_id:
-                print(f"Using cached transcription for chunk {chunk_id}")
-                return segment["transcript"]
-        
-        # If not in cache, transcribe
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        
+    async def transcribe_chunk(self, chunk_path, video_id, chunk_id, start_ms, end_ms, audio_bytes=None):
+        """Transcribe a single audio chunk using OpenAI API (callers skip cached chunks)"""
         try:
-            with open(chunk_path, "rb") as audio_file:
-                data = aiohttp.FormData()
-                data.add_field("file", audio_file, filename=os.path.basename(chunk_path))
-                data.add_field("model", "whisper-1")
-                
-                async with session.post("https://api.openai.com/v1/audio/transcriptions", 
-                                      headers=headers, data=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        transcript = result.get("text", "")
-                        
-                        # Cache the result
-                        self.cache.save_segment(video_id, chunk_id, start_ms, end_ms, transcript)
-                        return transcript
-                    else:
-                        error_text = await response.text()
-                        print(f"API error: {error_text}")
-                        return f"[Error transcribing chunk {chunk_id}]"
+            if audio_bytes is None:
+                # Read the chunk off the event loop, which is shared with other transcriptions
+                loop = asyncio.get_running_loop()
+                audio_bytes = await loop.run_in_executor(None, Path(chunk_path).read_bytes)
+            
+            await transcription_rate_limiter.aacquire(0)
+            response = await self._get_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=(os.path.basename(chunk_path), audio_bytes)
+            )
+            transcript = response.text
+            
+            # Cache the result
+            self.cache.save_segment(video_id, chunk_id, start_ms, end_ms, transcript)
+            return transcript
+        except openai.APIStatusError as e:
+            print(f"API error: {e}")
+            return f"[Error transcribing chunk {chunk_id}]"
         except Exception as e:
             print(f"Error in chunk {chunk_id}: {e}")
             return f"[Error processing chunk {chunk_id}]"
@@ -50,41 +103,46 @@ class ParallelTranscriber:
     async def transcribe_audio_parallel(self, audio_path, video_id, segment_size_minutes=10, 
                                       max_concurrent=3, progress_callback=None):
         """Transcribe audio in parallel chunks with rate limiting"""
-        # Check if we already have a complete transcription
-        existing_transcript = self.cache.combine_transcripts(video_id)
-        if existing_transcript:
-            if progress_callback:
-                progress_callback("Transcription", 100, "Using cached transcription", 0)
-            return existing_transcript
-        
-        # Process the audio
-        sound = AudioSegment.from_file(audio_path)
+        # Process the audio, shortening chunks of a high-bitrate file so each stays
+        # under the upload size limit
         segment_size_ms = segment_size_minutes * 60 * 1000
-        total_duration_ms = len(sound)
+        segment_size_ms = min(segment_size_ms, AudioProcessor.max_segment_ms(audio_path) or segment_size_ms)
+        total_duration_ms = AudioProcessor.get_audio_duration_ms(audio_path)
         
         # Calculate total segments
         total_segments = (total_duration_ms + segment_size_ms - 1) // segment_size_ms
         
-        # Check for partially cached segments
+        # Check for cached segments; a complete transcription is stitched from them
+        # like any other run, with no chunks left to transcribe
         cached_segments = self.cache.get_cached_segments(video_id)
         cached_segment_nums = {s["segment"] for s in cached_segments}
+        if progress_callback and cached_segment_nums.issuperset(range(total_segments)):
+            progress_callback("Transcription", 100, "Using cached transcription", 0)
         
-        # Create temporary directory for chunks
-        temp_dir = f"./temp_chunks_{video_id}"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Prepare array for all transcripts
-        all_transcripts = [""] * total_segments
+        # Transcripts are written to disk in segment order as they complete; only
+        # segments that finish ahead of an earlier one wait in memory
+        pending = {s["segment"]: s["transcript"] for s in cached_segments if s["segment"] < total_segments}
+        del cached_segments
+        next_to_write = 0
+        previous = None
+        transcript_file = None
         
-        # Fill in cached transcripts
-        for segment in cached_segments:
-            all_transcripts[segment["segment"]] = segment["transcript"]
+        def write_in_order(chunk_id=None, transcript=None):
+            nonlocal next_to_write, previous
+            if chunk_id is not None:
+                pending[chunk_id] = transcript
+            while next_to_write in pending:
+                transcript = pending.pop(next_to_write)
+                if next_to_write:
+                    transcript_file.write(" ")
+                transcript_file.write(stitch_transcripts(previous, transcript) if previous else transcript)
+                previous = transcript
+                next_to_write += 1
         
-        # Prepare chunks for uncached segments
-        chunk_tasks = []
-        semaphore = asyncio.Semaphore(max_concurrent)  # Limit concurrent requests
+        # Limit concurrent requests for uncached segments
+        semaphore = asyncio.Semaphore(max_concurrent)
         
-        async def process_with_semaphore(session, chunk_path, chunk_id, start_ms, end_ms):
+        async def process_with_semaphore(chunk_id, start_ms, end_ms):
             if progress_callback:
                 progress_callback("Transcription", 
                                  ((chunk_id + 0.5) / total_segments) * 100,
@@ -92,8 +150,17 @@ class ParallelTranscriber:
                                  None)
             
             async with semaphore:
-                transcript = await self.transcribe_chunk(session, chunk_path, video_id, chunk_id, start_ms, end_ms)
-                all_transcripts[chunk_id] = transcript
+                # Cut straight into memory once a request slot is free, so at most
+                # max_concurrent chunks are held at a time and none touch the disk; each
+                # chunk runs into the next so no word is cut in half at the boundary
+                cut_end_ms = min(end_ms + TRANSCRIPTION_OVERLAP_MS, total_duration_ms)
+                audio_bytes = await loop.run_in_executor(
+                    None, AudioProcessor.extract_segment_bytes, audio_path, start_ms, cut_end_ms - start_ms
+                )
+                transcript = await self.transcribe_chunk(f"segment_{chunk_id}.mp3", video_id, chunk_id,
+                                                         start_ms, end_ms, audio_bytes)
+                del audio_bytes
+                write_in_order(chunk_id, transcript)
                 
                 if progress_callback:
                     progress_callback("Transcription", 
@@ -101,74 +168,93 @@ class ParallelTranscriber:
                                     f"Completed chunk {chunk_id+1}/{total_segments}", 
                                     None)
                 
-                # Clean up chunk file
-                if os.path.exists(chunk_path):
-                    os.remove(chunk_path)
-                    
                 return transcript
         
-        # Process uncached segments
-        async with aiohttp.ClientSession() as session:
-            for i in range(total_segments):
-                # Skip already cached segments
-                if i in cached_segment_nums:
-                    if progress_callback:
-                        progress_callback("Transcription", 
-                                         ((i + 1) / total_segments) * 100,
-                                         f"Using cached chunk {i+1}/{total_segments}", 
-                                         None)
-                    continue
-                
-                # Extract segment times
-                start_ms = i * segment_size_ms
-                end_ms = min((i + 1) * segment_size_ms, total_duration_ms)
-                
-                # Extract and save segment
-                segment = sound[start_ms:end_ms]
-                
-                # Compress aggressively to reduce API costs
-                segment = segment.set_channels(1)  # Convert to mono
-                segment = segment.set_frame_rate(16000)  # Set to 16kHz
+        # Report cached segments
+        for i in sorted(cached_segment_nums):
+            if i < total_segments and progress_callback:
+                progress_callback("Transcription", 
+                                 ((i + 1) / total_segments) * 100,
+                                 f"Using cached chunk {i+1}/{total_segments}", 
+                                 None)
+        
+        # The combined transcript is spooled in a temporary directory that is removed
+        # even if a task fails
+        loop = asyncio.get_running_loop()
+        with tempfile.TemporaryDirectory(prefix=f"yt_{video_id}_") as temp_dir:
+            transcript_path = os.path.join(temp_dir, "transcript.txt")
+            transcript_file = open(transcript_path, "w", buffering=1 << 20)
+            try:
+                write_in_order()
                 
-                chunk_path = os.path.join(temp_dir, f"chunk_{i}.mp3")
-                segment.export(chunk_path, format="mp3", bitrate="32k")
+                # Cut (stream copy, no re-encode) and transcribe only the chunks that are
+                # not cached; each chunk's upload starts as soon as it is cut
+                chunk_tasks = [
+                    process_with_semaphore(i, i * segment_size_ms,
+                                           min((i + 1) * segment_size_ms, total_duration_ms))
+                    for i in range(total_segments) if i not in cached_segment_nums
+                ]
                 
-                # Add to tasks
-                task = process_with_semaphore(session, chunk_path, i, start_ms, end_ms)
-                chunk_tasks.append(task)
+                # Execute all tasks
+                if chunk_tasks:
+                    await asyncio.gather(*chunk_tasks)
+            finally:
+                transcript_file.close()
             
-            # Execute all tasks
-            if chunk_tasks:
-                await asyncio.gather(*chunk_tasks)
-        
-        # Clean up temp directory
-        try:
-            os.rmdir(temp_dir)
-        except:
-            pass
-        
-        # Combine all transcripts
-        full_transcript = " ".join(all_transcripts)
+            # Combine all transcripts
+            full_transcript = Path(transcript_path).read_text()
         
         if progress_callback:
             progress_callback("Transcription", 100, "Transcription complete", 0)
             
         return full_transcript
 
+# One event loop and transcriber shared by every call, so the API client (and
+# its open connections to the API) outlives a single video
+_loop = None
+_transcriber = None
+_loop_lock = threading.Lock()
+
+def _get_transcriber():
+    """Start the background event loop and shared transcriber on first use"""
+    global _loop, _transcriber
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="parallel-transcription", daemon=True).start()
+            _transcriber = ParallelTranscriber()
+            atexit.register(_shutdown)
+    return _loop, _transcriber
+
+def _shutdown():
+    """Close the shared client and stop the background event loop"""
+    try:
+        asyncio.run_coroutine_threadsafe(_transcriber.aclose(), _loop).result(timeout=5)
+    except Exception as e:
+        print(f"Error closing transcription client: {e}")
+    _loop.call_soon_threadsafe(_loop.stop)
+
 # Helper function to run the async code
 def transcribe_with_parallelization(audio_path, video_id, segment_size_minutes=10,
                                  max_concurrent=3, progress_callback=None):
     """Synchronous wrapper for the async transcription"""
-    transcriber = ParallelTranscriber()
+    loop, transcriber = _get_transcriber()
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    # Progress is queued and reported from this thread, since UI callbacks are
+    # bound to the thread that renders the page
+    updates = queue.SimpleQueue()
+    report = (lambda *args: updates.put(args)) if progress_callback else None
     
-    try:
-        return loop.run_until_complete(
-            transcriber.transcribe_audio_parallel(
-                audio_path, video_id, segment_size_minutes, max_concurrent, progress_callback
-            )
-        )
-    finally:
-        loop.close()
\ No newline at end of file
+    # Safe to call from any thread; concurrent callers share the loop
+    future = asyncio.run_coroutine_threadsafe(
+        transcriber.transcribe_audio_parallel(
+            audio_path, video_id, segment_size_minutes, max_concurrent, report
+        ),
+        loop
+    )
+    while progress_callback and (not future.done() or not updates.empty()):
+        try:
+            progress_callback(*updates.get(timeout=0.1))
+        except queue.Empty:
+            pass
+    return future.result()
\ No newline at end of file